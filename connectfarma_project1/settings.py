@@ -53,6 +53,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Per-view latency histograms + sampled query logging (see store/metrics.py)
+    'store.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -84,11 +86,94 @@ WSGI_APPLICATION = 'connectfarma_project1.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DATABASE_PROFILE picks one of:
+#   sqlite        (default) WAL journal and write transactions that take the lock
+#                 up front, so concurrent checkouts wait for each other instead of
+#                 failing with "database is locked". PRAGMAs: SQLITE_PRAGMAS below,
+#                 applied to every new connection (see store/signals.py).
+#   sqlite-plain  Django's SQLite defaults, to compare against (run_benchmarks)
+#   postgres      PostgreSQL with a psycopg 3 connection pool (pip install "psycopg[pool]"),
+#                 or persistent connections with POSTGRES_POOL_MAX_SIZE=0.
+#                 POSTGRES_REPLICA_HOSTS=host1,host2 adds read replicas (see store/routers.py).
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'sqlite')
+SQLITE_PRAGMAS = {}
+DATABASE_REPLICAS = []
+
+if DATABASE_PROFILE in ('sqlite', 'sqlite-plain'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
     }
+    if DATABASE_PROFILE == 'sqlite':
+        DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+        SQLITE_PRAGMAS = {
+            'journal_mode': 'WAL',  # readers don't block the writer and vice versa
+            'synchronous': 'NORMAL',  # safe with WAL, no fsync per commit
+            'busy_timeout': 20000,  # ms to wait for the write lock
+            'mmap_size': 256 * 1024 * 1024,
+        }
+elif DATABASE_PROFILE == 'postgres':
+    _postgres = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'connectfarma'),
+        'USER': os.environ.get('POSTGRES_USER', 'connectfarma'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+    }
+    _pool_size = int(os.environ.get('POSTGRES_POOL_MAX_SIZE', '10'))
+    if _pool_size:
+        # Django doesn't allow CONN_MAX_AGE together with the pool
+        _postgres['OPTIONS'] = {'pool': {'min_size': 2, 'max_size': _pool_size, 'timeout': 10}}
+    else:
+        _postgres['CONN_MAX_AGE'] = int(os.environ.get('POSTGRES_CONN_MAX_AGE', '60'))
+        _postgres['CONN_HEALTH_CHECKS'] = True
+    DATABASES = {'default': _postgres}
+    for _i, _host in enumerate(filter(None, os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',')), 1):
+        DATABASES[f'replica{_i}'] = {
+            **_postgres,
+            'OPTIONS': {**_postgres.get('OPTIONS', {})},
+            'HOST': _host.strip(),
+            'TEST': {'MIRROR': 'default'},
+        }
+        DATABASE_REPLICAS.append(f'replica{_i}')
+else:
+    raise ValueError(f'Unknown DATABASE_PROFILE {DATABASE_PROFILE!r}')
+
+# Catalog API and export reads go to DATABASE_REPLICAS, everything else to default
+DATABASE_ROUTERS = ['store.routers.ReadReplicaRouter']
+
+
+# Cache
+# The catalog, service areas and product cards are invalidated by bumping
+# version keys in the cache (see store/catalog.py), so every worker process
+# has to see the same cache; Django's default per-process LocMemCache would
+# leave the other workers serving stale data.
+#   REDIS_URL=redis://host:6379/0   Redis (pip install redis), shared by several hosts
+#   otherwise                       files under CACHE_DIR, shared by the processes of one host
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / '.cache'),
+        }
+    }
+# Rendered product cards (store/cards.py): one entry per product, keyed by
+# content (id, updated_at, image manifest), so nothing has to be invalidated
+# across processes and each process keeps its own copy in memory
+CACHES['cards'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'store-cards',
+    'OPTIONS': {'MAX_ENTRIES': 20000},
 }
 
 
@@ -129,7 +214,29 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
+    # Generated by `manage.py build_product_thumbnails`, served under /static/thumbs/
+    ('thumbs', os.path.join(BASE_DIR, 'thumbnails')),
 ]
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# With DEBUG off, `collectstatic` gives every static file a content-hashed name,
+# so it can be cached by browsers for good
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.'
+                   + ('StaticFilesStorage' if DEBUG else 'ManifestStaticFilesStorage'),
+    },
+}
+
+# Product image thumbnails (see store/images.py)
+PRODUCT_THUMBNAIL_DIR = os.path.join(BASE_DIR, 'thumbnails')
+PRODUCT_THUMBNAIL_WIDTHS = (160, 320, 480, 640)
+
+# Request metrics (see store/metrics.py): share of requests whose queries are
+# recorded and logged (0 to 1), and the token a scraper sends to read /metrics/
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', '0.01'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
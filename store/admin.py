@@ -1,32 +1,94 @@
 # store/admin.py
+import logging
+
 from django.contrib import admin
-from .models import Consumer, Farmer, Product, Order, OrderItem
+from django.http import HttpResponse
+from django.utils import timezone
+from .models import Consumer, Farmer, Product, Order, OrderItem, Cart, FarmerLedger, LedgerEntry, OrderEvent, ServiceArea
+from .catalog import invalidate_catalog
+from .ledger import settle_farmers, write_payout_report
+from .taxonomy import lookup
+
+logger = logging.getLogger(__name__)
+
+APPROVAL_CHUNK_SIZE = 1000
 
 # --- Product Approval Action ---
 @admin.action(description='Approve selected products')
 def approve_products(modeladmin, request, queryset):
-    queryset.update(is_approved=True)
+    # One short UPDATE per chunk of ids (each its own transaction), so approving
+    # a huge selection never holds the write lock on the products table for long
+    pending = queryset.filter(is_approved=False).order_by('pk').values_list('pk', flat=True)
+    total = pending.count()
+    approved = last_pk = 0
+    try:
+        while True:
+            pks = list(pending.filter(pk__gt=last_pk)[:APPROVAL_CHUNK_SIZE])
+            if not pks:
+                break
+            approved += Product.objects.filter(pk__in=pks).update(is_approved=True, updated_at=timezone.now())
+            last_pk = pks[-1]
+            logger.info('Approved %d of %d products', approved, total)
+    finally:
+        # .update() skips the save signals, so refresh the consumer catalog here
+        invalidate_catalog()
+    modeladmin.message_user(request, f'{approved} products approved.')
     
+# --- Fix category / image from the product taxonomy registry ---
+@admin.action(description='Reset category and image from the product catalog')
+def apply_catalog_defaults(modeladmin, request, queryset):
+    products = list(queryset.only('id', 'name', 'category', 'image_path'))
+    now = timezone.now()
+    for product in products:
+        product_type = lookup(product.name)
+        product.category = product_type.category
+        product.image_path = product_type.image_path
+        product.updated_at = now
+    Product.objects.bulk_update(products, ['category', 'image_path', 'updated_at'], batch_size=500)
+    invalidate_catalog()
+    modeladmin.message_user(request, f'{len(products)} products updated from the catalog.')
+
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'farmer', 'price', 'stock', 'is_approved')
     list_filter = ('is_approved', 'category', 'farmer')
     search_fields = ('name', 'farmer__user__username')
-    actions = [approve_products]
+    actions = [approve_products, apply_catalog_defaults]
 
 # --- NEW: Farmer Payout Approval Action ---
 @admin.action(description='Approve payout request for selected farmers')
 def approve_payout(modeladmin, request, queryset):
     queryset.update(payout_status='approved')
 
+# --- Payout batch: settle the selected approved farmers, download the report ---
+@admin.action(description='Pay out selected approved farmers')
+def pay_out_farmers(modeladmin, request, queryset):
+    rows = settle_farmers(queryset, progress=lambda done, total: logger.info('Settled %d of %d farmers', done, total))
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="payouts-{timezone.now():%Y%m%d-%H%M%S}.csv"'
+    write_payout_report(rows, response)
+    return response
+
 class FarmerAdmin(admin.ModelAdmin):
     list_display = ('user', 'kisan_id', 'contact_no', 'payout_status') # Add payout_status
     list_filter = ('payout_status',) # Add filter
     search_fields = ('user__username', 'kisan_id')
-    actions = [approve_payout] # Add the action
+    actions = [approve_payout, pay_out_farmers] # Add the action
 
 # Register your models here
 admin.site.register(Consumer)
 admin.site.register(Farmer, FarmerAdmin) # Register Farmer with our new custom class
 admin.site.register(Product, ProductAdmin)
 admin.site.register(Order)
-admin.site.register(OrderItem)
\ No newline at end of file
+admin.site.register(OrderItem)
+admin.site.register(Cart)
+admin.site.register(FarmerLedger)
+admin.site.register(LedgerEntry)
+admin.site.register(OrderEvent)
+
+
+# Saving or deleting an area reloads every process's pincode index (see store/service.py)
+@admin.register(ServiceArea)
+class ServiceAreaAdmin(admin.ModelAdmin):
+    list_display = ('pincode_prefix', 'farmer', 'is_active')
+    list_filter = ('is_active',)
+    search_fields = ('pincode_prefix', 'farmer__user__username')
@@ -0,0 +1,430 @@
+# store/benchmarks.py
+# Benchmarks of the hot store endpoints (`manage.py run_benchmarks`).
+# Every scenario sends real requests through the Django test client (full
+# middleware stack, sessions, templates) against a seeded marketplace (see
+# store/seed.py). Each request is timed on its own; queries and memory
+# allocations are measured in a separate, shorter pass, because counting
+# them slows requests down. Reports are JSON, so a run can be saved as a
+# baseline and a later run compared with it.
+# run_concurrent_load() is the write-contention test for the database
+# profiles (settings.DATABASE_PROFILE): checkouts and catalog reads from
+# several threads at once, each thread on its own connection.
+# run_http_load() instead sends real HTTP requests from many concurrent
+# connections to a running server, to compare the WSGI and ASGI deployments
+# on the two async views (the catalog API and the cart update).
+import asyncio
+import itertools
+import json
+import math
+import platform
+import subprocess
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlsplit
+
+import django
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import OperationalError, connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.middleware.csrf import CSRF_SECRET_LENGTH
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from .cart import CartProblem, clear_cart, update_cart_lines
+from .catalog import catalog_page, invalidate_catalog
+from .checkout import place_order
+from .models import Consumer, Farmer, Product
+from .seed import SEED_PREFIX
+
+SCENARIOS = {}  # name -> (role, scenario function)
+PERCENTILES = (50, 95, 99)
+# compare_reports(): metrics checked for regressions, and what counts as one
+REGRESSION_METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'alloc_kib')
+DEFAULT_THRESHOLD = 0.2  # 20% slower / bigger
+CHECKOUT_LINES = 3
+CHECKOUT_RESTOCK = 100  # checkout products are topped up to this before they sell out
+
+
+def scenario(name, role):
+    """
+    Register a scenario. It is called with the Bench and the role's client before
+    every request, does any untimed setup and returns a callable sending the timed request.
+    """
+    def register(func):
+        SCENARIOS[name] = (role, func)
+        return func
+    return register
+
+
+class Bench:
+    """Logged-in clients and the rows the scenarios pick from."""
+
+    def __init__(self):
+        # The consumer with the most orders and the farmer with the most sold items,
+        # so the scenarios see the heaviest pages of the seeded data
+        self.consumer = (Consumer.objects.filter(user__username__startswith=SEED_PREFIX)
+                         .annotate(n=Count('order')).order_by('-n', 'id').select_related('user').first())
+        self.farmer = (Farmer.objects.filter(user__username__startswith=SEED_PREFIX)
+                       .annotate(n=Count('product__orderitem')).order_by('-n', 'id').select_related('user').first())
+        if self.consumer is None or self.farmer is None:
+            raise ValueError('No seeded marketplace; run seed_marketplace first.')
+
+        self.product_ids = list(
+            Product.objects.filter(is_approved=True, stock__gt=0, price__gt=0)
+            .order_by('id').values_list('id', flat=True)
+        )
+        # Checkout only buys from farmers delivering to the checkout pincode
+        self.pincode = self.farmer.pincode
+        self.checkout_ids = list(
+            Product.objects.filter(farmer=self.farmer, is_approved=True, stock__gt=0, price__gt=0)
+            .order_by('id').values_list('id', flat=True)[:CHECKOUT_LINES]
+        )
+        self.clients = {'consumer': Client(), 'farmer': Client()}
+        self.clients['consumer'].force_login(self.consumer.user)
+        self.clients['farmer'].force_login(self.farmer.user)
+        self.counter = 0
+
+    def next_products(self, count):
+        # Walks through the listable products, so cart updates touch different rows
+        start = self.counter * count % max(len(self.product_ids), 1)
+        return (self.product_ids * 2)[start:start + count]
+
+
+# --- Scenarios ---
+
+@scenario('consumer_home', 'consumer')
+def consumer_home(bench, client):
+    return lambda: client.get('/home/')
+
+
+@scenario('consumer_home_search', 'consumer')
+def consumer_home_search(bench, client):
+    return lambda: client.get('/home/', {'q': 'tomato'})
+
+
+@scenario('update_cart', 'consumer')
+def update_cart(bench, client):
+    lines = {str(product_id): 1 + bench.counter % 3 for product_id in bench.next_products(2)}
+    body = {'lines': lines}
+    return lambda: client.post('/cart/update/', body, content_type='application/json')
+
+
+@scenario('checkout_view', 'consumer')
+def checkout(bench, client):
+    # Keep the products in stock, or the checkout would only measure the sold-out redirect
+    Product.objects.filter(id__in=bench.checkout_ids, stock__lt=CHECKOUT_LINES * 2).update(
+        stock=CHECKOUT_RESTOCK, updated_at=timezone.now())
+    clear_cart(bench.consumer)
+    update_cart_lines(bench.consumer, {product_id: 1 for product_id in bench.checkout_ids})
+    form = {
+        'user-full-name': 'Bench Consumer', 'user-mobile': '8888888888', 'user-address': 'Bench Street',
+        'user-pincode': bench.pincode, 'payment-method-new': 'Cash On Delivery',
+    }
+    return lambda: client.post('/cart/checkout/', form)
+
+
+@scenario('farmer_dashboard', 'farmer')
+def farmer_dashboard(bench, client):
+    return lambda: client.get('/farmer/dashboard/')
+
+
+@scenario('farmer_payments', 'farmer')
+def farmer_payments(bench, client):
+    return lambda: client.get('/farmer/payments/')
+
+
+# --- Running ---
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(timings):
+    """Latency percentiles, mean and max (ms) of a non-empty list of timings."""
+    result = {f'p{p}_ms': round(percentile(timings, p), 3) for p in PERCENTILES}
+    result['mean_ms'] = round(sum(timings) / len(timings), 3)
+    result['max_ms'] = round(max(timings), 3)
+    return result
+
+
+def _send(bench, role, func):
+    request = func(bench, bench.clients[role])
+    bench.counter += 1
+    return request
+
+
+def run_scenario(bench, name, iterations=100, warmup=10, profile_iterations=10):
+    role, func = SCENARIOS[name]
+    errors = 0
+    for _ in range(warmup):
+        _send(bench, role, func)()
+
+    timings = []
+    for _ in range(iterations):
+        request = _send(bench, role, func)
+        started = time.perf_counter()
+        response = request()
+        timings.append((time.perf_counter() - started) * 1000)
+        errors += response.status_code >= 400
+
+    queries, allocations = [], []
+    for _ in range(profile_iterations):
+        request = _send(bench, role, func)
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as captured:
+            response = request()
+        allocations.append(tracemalloc.get_traced_memory()[1] / 1024)  # peak
+        tracemalloc.stop()
+        queries.append(len(captured))
+        errors += response.status_code >= 400
+
+    result = summarize(timings)
+    result.update({
+        'queries': max(queries) if queries else None,
+        'alloc_kib': round(max(allocations), 1) if allocations else None,
+        'requests': iterations,
+        'errors': errors,
+    })
+    return result
+
+
+# --- Concurrent load ---
+
+def run_concurrent_load(threads=8, seconds=5.0):
+    """
+    Half of `threads` place one-line orders, the other half page through the
+    catalog API, for `seconds`. Returns a result per kind of operation, with
+    its throughput and how many operations failed (e.g. "database is locked"
+    after place_order's retries).
+    """
+    farmers = list(
+        Farmer.objects.filter(user__username__startswith=SEED_PREFIX, product__is_approved=True)
+        .distinct().order_by('id')
+    )
+    consumers = list(Consumer.objects.filter(user__username__startswith=SEED_PREFIX).order_by('id'))
+    if not farmers or not consumers:
+        raise ValueError('No seeded marketplace; run seed_marketplace first.')
+    # Plenty of stock, so no checkout fails for lack of it
+    Product.objects.filter(farmer__in=farmers, is_approved=True, price__gt=0).update(
+        stock=1_000_000, updated_at=timezone.now())
+    invalidate_catalog()
+    products = {
+        farmer.id: list(Product.objects.filter(farmer=farmer, is_approved=True, price__gt=0).values_list('id', flat=True))
+        for farmer in farmers
+    }
+    categories = [key for key, label in Product.CATEGORY_CHOICES]
+
+    timings = {'concurrent_checkout': [], 'concurrent_catalog': []}
+    errors = {name: 0 for name in timings}
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def checkout(i, n):
+        farmer = farmers[i % len(farmers)]
+        shipping = {'full_name': 'Load Test', 'mobile': '8888888888', 'address': 'Load Street',
+                    'pincode': farmer.pincode, 'payment_method': 'Cash On Delivery'}
+        product_id = products[farmer.id][n % len(products[farmer.id])]
+        place_order(consumers[i % len(consumers)], {str(product_id): 1}, shipping)
+
+    def browse(i, n):
+        catalog_page({'category': categories[n % len(categories)], 'limit': '24'})
+
+    def worker(i):
+        name, operation = ('concurrent_checkout', checkout) if i % 2 == 0 else ('concurrent_catalog', browse)
+        own_timings, own_errors, n = [], 0, 0
+        try:
+            start.wait()
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    operation(i, n)
+                except (OperationalError, CartProblem):
+                    own_errors += 1
+                own_timings.append((time.perf_counter() - started) * 1000)
+                n += 1
+        finally:
+            connection.close()
+            with lock:
+                timings[name] += own_timings
+                errors[name] += own_errors
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    results = {}
+    for name, values in timings.items():
+        if values:
+            results[name] = {**summarize(values), 'throughput_rps': round(len(values) / seconds, 1),
+                             'requests': len(values), 'errors': errors[name], 'queries': None, 'alloc_kib': None}
+    return results
+
+
+# --- HTTP load against a running server (WSGI vs ASGI) ---
+
+HTTP_SCENARIOS = ('catalog_api', 'update_cart')
+HTTP_TIMEOUT = 30  # seconds before a request counts as failed
+
+
+def _http_requests(name, bench, host):
+    """An endless cycle of raw HTTP/1.1 requests for one scenario, as the seeded consumer."""
+    client = bench.clients['consumer']
+    csrf_token = get_random_string(CSRF_SECRET_LENGTH)
+    cookie = (f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; '
+              f'{settings.CSRF_COOKIE_NAME}={csrf_token}')
+
+    def request(method, path, body=b''):
+        head = (f'{method} {path} HTTP/1.1\r\nHost: {host}\r\nCookie: {cookie}\r\n'
+                f'X-CSRFToken: {csrf_token}\r\nConnection: close\r\n')
+        if body:
+            head += f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+        return (head + '\r\n').encode() + body
+
+    if name == 'catalog_api':
+        categories = [key for key, label in Product.CATEGORY_CHOICES]
+        return itertools.cycle([request('GET', f'/api/catalog/?category={category}&limit=24') for category in categories])
+    return itertools.cycle([
+        request('POST', '/cart/update/', json.dumps({'lines': {str(product_id): 1 + i % 3}}).encode())
+        for i, product_id in enumerate(bench.product_ids[:50])
+    ])
+
+
+async def _http_request(host, port, raw, slow_ms):
+    # One request on its own connection; returns the response status
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        if slow_ms:
+            # A slow (mobile) client: the request arrives in two parts
+            half = len(raw) // 2
+            writer.write(raw[:half])
+            await writer.drain()
+            await asyncio.sleep(slow_ms / 1000)
+            raw = raw[half:]
+        writer.write(raw)
+        await writer.drain()
+        response = await reader.read()  # the server closes the connection when done
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def _http_load(host, port, requests, connections, seconds, slow_ms):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+    timings, errors = [], [0]
+
+    async def connection_loop():
+        while loop.time() < deadline:
+            started = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(_http_request(host, port, next(requests), slow_ms), HTTP_TIMEOUT)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                status = None
+            timings.append((time.perf_counter() - started) * 1000)
+            if status is None or status >= 400:
+                errors[0] += 1
+
+    await asyncio.gather(*(connection_loop() for _ in range(connections)))
+    return timings, errors[0]
+
+
+def run_http_load(base_url, names=None, connections=50, seconds=10.0, slow_ms=0):
+    """
+    Load a running server (e.g. gunicorn or uvicorn on this project) from
+    `connections` concurrent connections per scenario and return a report like
+    run_benchmarks(). The server must use this configuration's database,
+    seeded with seed_marketplace.
+    """
+    names = names or list(HTTP_SCENARIOS)
+    unknown = set(names) - set(HTTP_SCENARIOS)
+    if unknown:
+        raise ValueError(f'Unknown scenario(s): {", ".join(sorted(unknown))}')
+    url = urlsplit(base_url)
+    if url.scheme != 'http' or not url.hostname:
+        raise ValueError('The server URL must look like http://127.0.0.1:8000')
+    host, port = url.hostname, url.port or 80
+
+    bench = Bench()
+    scenarios = {}
+    for name in names:
+        requests = _http_requests(name, bench, url.netloc)
+        timings, errors = asyncio.run(_http_load(host, port, requests, connections, seconds, slow_ms))
+        scenarios[name] = {**summarize(timings), 'throughput_rps': round(len(timings) / seconds, 1),
+                           'requests': len(timings), 'errors': errors, 'queries': None, 'alloc_kib': None}
+    return {
+        'commit': _git_commit(),
+        'created_at': timezone.now().isoformat(),
+        'server': base_url,
+        'connections': connections,
+        'slow_ms': slow_ms,
+        'database_profile': settings.DATABASE_PROFILE,
+        'scenarios': scenarios,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(names=None, iterations=100, warmup=10, profile_iterations=10, threads=0, seconds=5.0):
+    """
+    Run the scenarios (all by default) against the seeded marketplace and return
+    a report dict. With `threads`, run_concurrent_load() runs afterwards.
+    """
+    names = names or list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f'Unknown scenario(s): {", ".join(sorted(unknown))}')
+
+    cache.clear()
+    caches['cards'].clear()
+    bench = Bench()
+    report = {
+        'commit': _git_commit(),
+        'created_at': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'database_profile': settings.DATABASE_PROFILE,
+        'iterations': iterations,
+        'scenarios': {name: run_scenario(bench, name, iterations, warmup, profile_iterations) for name in names},
+    }
+    if threads:
+        report['threads'] = threads
+        report['scenarios'].update(run_concurrent_load(threads, seconds))
+    return report
+
+
+def compare_reports(baseline, report, threshold=DEFAULT_THRESHOLD):
+    """
+    Return [(scenario, metric, baseline value, new value)] for every metric that
+    got worse by more than `threshold` (a fraction). Query counts may not grow at all.
+    """
+    regressions = []
+    for name, result in report['scenarios'].items():
+        old = baseline.get('scenarios', {}).get(name)
+        if not old:
+            continue
+        for metric in REGRESSION_METRICS:
+            before, after = old.get(metric), result.get(metric)
+            if before is None or after is None:
+                continue
+            allowed = before if metric == 'queries' else before * (1 + threshold)
+            if after > allowed:
+                regressions.append((name, metric, before, after))
+    return regressions
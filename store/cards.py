@@ -0,0 +1,52 @@
+# store/cards.py
+# Rendered product cards, cached one by one.
+# Each card's HTML is cached under (template, product id, updated_at) in the
+# per-process 'cards' cache (settings.CACHES), so a page is put together from
+# one get_many() and only new or changed products are rendered. Saving a
+# product changes updated_at, so there is nothing to invalidate. Cards are shared by every visitor: anything per-user must be
+# filled in afterwards (the CSRF token is, see render_cards()).
+from django.core.cache import caches
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from .images import manifest_version
+
+CARD_TIMEOUT = 60 * 60 * 24
+# Rendered in place of the CSRF token and swapped for the visitor's token afterwards
+CSRF_PLACEHOLDER = '__card_csrf_token__'
+
+
+def _get(product, name):
+    # Catalog rows are dicts, the farmer pages pass model instances
+    return product[name] if isinstance(product, dict) else getattr(product, name)
+
+
+def card_key(template_name, product, images_version=None):
+    updated_at = _get(product, 'updated_at')
+    return f'store:card:{template_name}:{_get(product, "id")}:{updated_at.timestamp()}:{images_version}'
+
+
+def render_cards(template_name, products, csrf_token=None):
+    """Return the HTML of one card per product, rendered with `template_name`."""
+    products = list(products)
+    images_version = manifest_version()
+    keys = [card_key(template_name, product, images_version) for product in products]
+    card_cache = caches['cards']
+    cached = card_cache.get_many(keys)
+
+    template = None
+    rendered = {}
+    parts = []
+    for key, product in zip(keys, products):
+        html = cached.get(key)
+        if html is None:
+            template = template or get_template(template_name)
+            html = rendered[key] = template.render({'product': product, 'csrf_token': CSRF_PLACEHOLDER})
+        parts.append(html)
+    if rendered:
+        card_cache.set_many(rendered, CARD_TIMEOUT)
+
+    html = ''.join(parts)
+    if csrf_token is not None:
+        html = html.replace(CSRF_PLACEHOLDER, str(csrf_token))
+    return mark_safe(html)
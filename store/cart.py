@@ -0,0 +1,239 @@
+# store/cart.py
+# Cart store + cart pricing service.
+# - The cart lives in the Cart / CartLine tables, one row per line, so a
+#   quantity change is a single-row upsert instead of a full session rewrite.
+#   Everywhere else a cart is handled as a plain {product_id (str): quantity} dict.
+# - Pricing: instead of one Product.objects.get() per line, the whole cart is
+#   resolved with a single id__in query and every problem line is reported at once.
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Cart, CartLine, Product
+from .service import service_index
+
+MAX_CART_CHANGES = 200  # lines per update_cart request
+# What CartLine.quantity can hold; bigger numbers overflow the column
+MAX_LINE_QUANTITY = connection.ops.integer_field_range('PositiveIntegerField')[1]
+
+
+class InvalidCartChange(ValueError):
+    pass
+
+
+# --- Cart store ---
+
+def get_cart(consumer):
+    """Return the consumer's cart as {product_id (str): quantity}."""
+    lines = CartLine.objects.filter(cart__consumer=consumer).values_list('product_id', 'quantity')
+    return {str(product_id): quantity for product_id, quantity in lines}
+
+
+def get_cart_version(consumer):
+    """Version number of the stored cart; it goes up on every change."""
+    return Cart.objects.filter(consumer=consumer).values_list('version', flat=True).first() or 0
+
+
+def _clean_changes(changes):
+    # {product_id: quantity} from the client -> ({int id: qty > 0}, {int ids to remove})
+    upserts, removals = {}, set()
+    for product_id, quantity in changes.items():
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            continue  # not a product, like any unknown id
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError, OverflowError):
+            raise InvalidCartChange(f'Invalid quantity for product {product_id}.')
+        if not 0 <= quantity <= MAX_LINE_QUANTITY:
+            raise InvalidCartChange(f'Quantity for product {product_id} must be from 0 to {MAX_LINE_QUANTITY}.')
+        if quantity > 0:
+            upserts[product_id] = quantity
+            removals.discard(product_id)
+        else:
+            removals.add(product_id)
+            upserts.pop(product_id, None)
+    return upserts, removals
+
+
+def update_cart_lines(consumer, changes):
+    """
+    Apply several {product_id: quantity} changes at once: a quantity above 0 is
+    upserted, 0 removes the line. Unknown products are ignored; a quantity that
+    is not a whole number from 0 to MAX_LINE_QUANTITY raises InvalidCartChange
+    and nothing is changed. Returns the cart's new version number.
+    """
+    upserts, removals = _clean_changes(changes)
+
+    with transaction.atomic():
+        cart = Cart.objects.get_or_create(consumer=consumer)[0]
+
+        if removals:
+            CartLine.objects.filter(cart=cart, product_id__in=removals).delete()
+
+        if upserts:
+            existing_ids = Product.objects.filter(id__in=list(upserts)).values_list('id', flat=True)
+            CartLine.objects.bulk_create(
+                [CartLine(cart=cart, product_id=product_id, quantity=upserts[product_id]) for product_id in existing_ids],
+                update_conflicts=True,
+                unique_fields=['cart', 'product'],
+                update_fields=['quantity'],
+            )
+
+        Cart.objects.filter(pk=cart.pk).update(version=F('version') + 1, updated_at=timezone.now())
+        return Cart.objects.values_list('version', flat=True).get(pk=cart.pk)
+
+
+def apply_cart_changes(consumer, changes):
+    """
+    update_cart_lines() plus the cart read back in the same transaction, so the
+    version and the lines always match. Returns (version, cart dict).
+    """
+    with transaction.atomic():
+        version = update_cart_lines(consumer, changes)
+        return version, get_cart(consumer)
+
+
+def clear_cart(consumer):
+    with transaction.atomic():
+        CartLine.objects.filter(cart__consumer=consumer).delete()
+        Cart.objects.filter(consumer=consumer).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def merge_session_cart(request, consumer):
+    """
+    Move a cart kept in the session (carts from before the Cart table existed)
+    into the consumer's stored cart, keeping the larger quantity of each line.
+    """
+    session_cart = request.session.pop('cart', None)
+    if not session_cart:
+        return
+
+    stored = get_cart(consumer)
+    merged = {}
+    for product_id, quantity in session_cart.items():
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            continue
+        if 0 < quantity <= MAX_LINE_QUANTITY:
+            merged[product_id] = max(quantity, stored.get(str(product_id), 0))
+    if merged:
+        update_cart_lines(consumer, merged)
+
+
+# --- Cart pricing ---
+
+
+@dataclass
+class PricedCart:
+    # Every resolved line: {'product', 'quantity', 'item_total', 'status'}
+    # status is 'ok', 'unapproved', 'undeliverable' or 'out_of_stock'
+    lines: list = field(default_factory=list)
+    subtotal: Decimal = Decimal('0.00')  # 'ok' lines only
+    total_items: int = 0  # 'ok' lines only
+    missing: list = field(default_factory=list)  # product ids (str) that no longer exist
+    unapproved: list = field(default_factory=list)  # lines not approved for sale
+    undeliverable: list = field(default_factory=list)  # lines whose farmer doesn't serve the pincode
+    out_of_stock: list = field(default_factory=list)  # lines asking for more than the stock
+
+    @property
+    def has_problems(self):
+        return bool(self.missing or self.unapproved or self.undeliverable or self.out_of_stock)
+
+    def problem_messages(self):
+        problems = []
+        if self.missing:
+            problems.append(f'{len(self.missing)} item(s) in your cart are no longer available and were removed.')
+        if self.unapproved:
+            names = ', '.join(line['product'].name for line in self.unapproved)
+            problems.append(f'Not available for sale right now: {names}.')
+        if self.undeliverable:
+            names = ', '.join(line['product'].name for line in self.undeliverable)
+            problems.append(f'Not delivered to your pincode: {names}.')
+        if self.out_of_stock:
+            names = ', '.join(line['product'].name for line in self.out_of_stock)
+            problems.append(f'Not enough stock for: {names}.')
+        return problems
+
+
+class CartProblem(Exception):
+    # Raised inside checkout's transaction so nothing is written
+    def __init__(self, priced):
+        super().__init__(' '.join(priced.problem_messages()))
+        self.priced = priced
+
+
+def price_cart(cart, queryset=None, pincode=None):
+    """
+    Resolve a cart dict in one query.
+    Only approved lines with enough stock count towards the subtotal,
+    the others are still returned (flagged) so the consumer can fix them.
+    `queryset` lets checkout pass a locked / narrowed Product queryset.
+    With a `pincode`, lines from farmers who don't deliver there are flagged too.
+    """
+    priced, ids = _cart_ids(cart)
+    if queryset is None:
+        queryset = Product.objects.all()
+    products = queryset.in_bulk(list(ids))
+    serving = service_index.farmers_serving(pincode) if pincode is not None else None
+    return _price_lines(priced, ids, products, serving)
+
+
+async def aprice_cart(cart):
+    """price_cart() for async views (no pincode check, that index is sync-only)."""
+    priced, ids = _cart_ids(cart)
+    products = await Product.objects.ain_bulk(list(ids))
+    return _price_lines(priced, ids, products, None)
+
+
+def _cart_ids(cart):
+    # -> (PricedCart with the unparseable lines as missing, {int id: (cart key, quantity)})
+    priced = PricedCart()
+    ids = {}
+    for product_id, quantity in cart.items():
+        try:
+            ids[int(product_id)] = (product_id, int(quantity))
+        except (TypeError, ValueError):
+            priced.missing.append(product_id)
+    return priced, ids
+
+
+def _price_lines(priced, ids, products, serving):
+    for pk, (product_id, quantity) in ids.items():
+        product = products.get(pk)
+        if product is None:
+            priced.missing.append(product_id)
+            continue
+
+        line = {
+            'product': product,
+            'quantity': quantity,
+            'item_total': product.price * quantity,
+            'status': 'ok',
+        }
+        priced.lines.append(line)
+        if not product.is_approved:
+            line['status'] = 'unapproved'
+            priced.unapproved.append(line)
+        elif serving is not None and product.farmer_id not in serving:
+            line['status'] = 'undeliverable'
+            priced.undeliverable.append(line)
+        elif product.stock < quantity:
+            line['status'] = 'out_of_stock'
+            priced.out_of_stock.append(line)
+        else:
+            priced.subtotal += line['item_total']
+            priced.total_items += quantity
+
+    return priced
+
+
+def drop_missing_lines(consumer, priced):
+    # Lines whose product no longer exists are removed from the stored cart
+    if priced.missing:
+        update_cart_lines(consumer, {product_id: 0 for product_id in priced.missing})
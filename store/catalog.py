@@ -0,0 +1,207 @@
+# store/catalog.py
+# Read model for the consumer catalog.
+# All listable products are loaded in ONE query, grouped by category in memory
+# and kept in the cache under a version number. Any change to a Product bumps
+# the version (see store/signals.py), so stale catalogs are simply never read again.
+import base64
+import json
+import time
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Product
+from .routers import replica_reads
+from .service import normalize_pincode, service_index
+
+CATALOG_VERSION_KEY = 'store:catalog:version'
+CATALOG_TIMEOUT = 60 * 15  # 15 minutes, the version bump does the real invalidation
+
+# Only the fields the product cards need (plus farmer_id for filtering and
+# updated_at for the card cache key, see store/cards.py)
+CATALOG_FIELDS = ('id', 'name', 'price', 'unit', 'image_path', 'category', 'farmer_id', 'updated_at')
+
+# Per-process copy of the last catalog we built or read, so a cache hit
+# does not even need to unpickle the catalog again.
+_local_catalog = {'version': None, 'catalog': None}
+
+
+def listable_products():
+    # A product is shown to consumers only if it is approved, priced and in stock
+    return Product.objects.filter(is_approved=True, stock__gt=0, price__gt=0)
+
+
+def _new_version():
+    # Time based, so a fresh version never collides with an old cached catalog
+    return int(time.time() * 1000)
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, _new_version(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def invalidate_catalog():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # Key is missing (evicted or never set)
+        cache.set(CATALOG_VERSION_KEY, _new_version(), timeout=None)
+
+
+def build_catalog():
+    catalog = {key: [] for key, label in Product.CATEGORY_CHOICES}
+    for row in listable_products().order_by('category', 'price', 'id').values(*CATALOG_FIELDS):
+        catalog.setdefault(row['category'], []).append(row)
+    return catalog
+
+
+def get_catalog():
+    """Return {category: [product rows]} for every listable product."""
+    version = get_catalog_version()
+    if _local_catalog['version'] == version:
+        return _local_catalog['catalog']
+
+    cache_key = f'store:catalog:{version}'
+    catalog = cache.get(cache_key)
+    if catalog is None:
+        catalog = build_catalog()
+        cache.set(cache_key, catalog, CATALOG_TIMEOUT)
+
+    _local_catalog['version'] = version
+    _local_catalog['catalog'] = catalog
+    return catalog
+
+
+# --- Keyset (cursor) pagination for the catalog JSON API ---
+# Pages are ordered by (category, price, id) and a cursor is simply the
+# sort key of the last row, so every page is one bounded, indexed query
+# no matter how deep the client scrolls.
+API_FIELDS = ('id', 'name', 'price', 'unit', 'image_path')
+API_DEFAULT_LIMIT = 24
+API_MAX_LIMIT = 100
+
+
+class InvalidCatalogQuery(ValueError):
+    pass
+
+
+def encode_cursor(row):
+    raw = json.dumps([row['category'], str(row['price']), row['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        category, price, product_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(category), Decimal(price), int(product_id)
+    except (ValueError, TypeError, ArithmeticError):
+        raise InvalidCatalogQuery('Invalid cursor.')
+
+
+def _parse_price(value, name):
+    try:
+        price = Decimal(value)
+    except ArithmeticError:
+        raise InvalidCatalogQuery(f'Invalid {name}.')
+    if not price.is_finite():
+        raise InvalidCatalogQuery(f'Invalid {name}.')
+    return price
+
+
+def _parse_pincode(params):
+    # None when not filtering by pincode; '380 007' is fine, '3800' is not
+    if not params.get('pincode'):
+        return None
+    pincode = normalize_pincode(params['pincode'])
+    if pincode is None:
+        raise InvalidCatalogQuery('Invalid pincode, it must have 6 digits.')
+    return pincode
+
+
+def catalog_page(params):
+    """
+    Return one page of the listable catalog as
+    {'results': [...], 'next_cursor': str or None}.
+    `params` is a QueryDict (request.GET) with optional category, min_price,
+    max_price, unit, pincode, cursor and limit.
+    """
+    pincode = _parse_pincode(params)
+    farmer_ids = service_index.farmers_serving(pincode) if pincode else None
+    rows, limit = _page_query(params, farmer_ids)
+    # Browsing can be a moment behind, so the page is read from a replica (see store/routers.py)
+    with replica_reads():
+        rows = list(rows)
+    return _page_result(rows, limit)
+
+
+async def acatalog_page(params):
+    """catalog_page() for async views."""
+    pincode = _parse_pincode(params)
+    # The service index may reload itself from the database, which is sync-only
+    farmer_ids = await sync_to_async(service_index.farmers_serving)(pincode) if pincode else None
+    rows, limit = _page_query(params, farmer_ids)
+    with replica_reads():
+        rows = [row async for row in rows]
+    return _page_result(rows, limit)
+
+
+def _page_query(params, farmer_ids):
+    # -> (unevaluated queryset of one page of rows plus one, limit)
+    products = listable_products()
+
+    category = params.get('category')
+    if category:
+        products = products.filter(category=category)
+    unit = params.get('unit')
+    if unit:
+        products = products.filter(unit=unit)
+    if farmer_ids is not None:
+        # Farmers who deliver to the pincode, from the in-memory index (see store/service.py)
+        products = products.filter(farmer_id__in=farmer_ids)
+    if params.get('min_price'):
+        products = products.filter(price__gte=_parse_price(params['min_price'], 'min_price'))
+    if params.get('max_price'):
+        products = products.filter(price__lte=_parse_price(params['max_price'], 'max_price'))
+
+    cursor = params.get('cursor')
+    if cursor:
+        last_category, last_price, last_id = decode_cursor(cursor)
+        products = products.filter(
+            Q(category__gt=last_category)
+            | Q(category=last_category, price__gt=last_price)
+            | Q(category=last_category, price=last_price, id__gt=last_id)
+        )
+
+    try:
+        limit = int(params.get('limit', API_DEFAULT_LIMIT))
+    except ValueError:
+        raise InvalidCatalogQuery('Invalid limit.')
+    limit = max(1, min(limit, API_MAX_LIMIT))
+
+    # Fetch one extra row to know if there is a next page
+    return products.order_by('category', 'price', 'id').values('category', *API_FIELDS)[:limit + 1], limit
+
+
+def _page_result(rows, limit):
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        'results': [
+            {
+                'id': row['id'],
+                'name': row['name'],
+                'price': str(row['price']),
+                'unit': row['unit'],
+                'image_path': row['image_path'],
+            }
+            for row in rows
+        ],
+        'next_cursor': encode_cursor(rows[-1]) if has_next else None,
+    }
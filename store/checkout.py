@@ -0,0 +1,94 @@
+# store/checkout.py
+# Checkout engine.
+# Stock is taken with a conditional UPDATE (stock = stock - qty WHERE stock >= qty)
+# so two consumers can never buy the same last unit, and all OrderItems are
+# written with one bulk_create. SQLite "database is locked" errors are retried
+# with exponential backoff.
+import random
+import time
+
+from django.db import OperationalError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cart import CartProblem, price_cart
+from .catalog import invalidate_catalog
+from .dashboard import invalidate_farmer_metrics
+from .events import publish
+from .models import Order, OrderItem, Product
+from .search import search_index
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.05  # seconds, doubled on every retry
+
+
+def _is_lock_error(error):
+    # SQLite reports both "database is locked" and "database table is locked"
+    return 'locked' in str(error).lower()
+
+
+def _create_order(consumer, cart, shipping):
+    with transaction.atomic():
+        priced = price_cart(cart, pincode=shipping['pincode'])
+        if priced.has_problems:
+            raise CartProblem(priced)
+
+        order = Order.objects.create(consumer=consumer, total_amount=priced.subtotal, **shipping)
+
+        for line in priced.lines:
+            taken = Product.objects.filter(
+                id=line['product'].id, stock__gte=line['quantity']
+            ).update(stock=F('stock') - line['quantity'], updated_at=timezone.now())
+            if not taken:
+                # Someone bought it between pricing and now; the whole order rolls back
+                line['status'] = 'out_of_stock'
+                priced.out_of_stock.append(line)
+
+        if priced.out_of_stock:
+            raise CartProblem(priced)
+
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=line['product'],
+                quantity=line['quantity'],
+                price=line['product'].price,
+            )
+            for line in priced.lines
+        ])
+
+        product_ids = [line['product'].id for line in priced.lines]
+        farmer_ids = [line['product'].farmer_id for line in priced.lines]
+        # Farmer notifications, stock alerts etc. run in the event worker (see store/events.py)
+        publish('order_placed', order)
+        # robust: the order is already committed, so a failure here must not
+        # reach place_order() and be retried as if the order had failed
+        transaction.on_commit(lambda: _order_placed(product_ids, farmer_ids), robust=True)
+    return order
+
+
+def _order_placed(product_ids, farmer_ids):
+    # The F() updates skip the save signals, so refresh the catalog ourselves.
+    # The catalog and the search index don't show stock, so only products that
+    # just sold out (and leave the catalog) change them.
+    sold_out = list(Product.objects.filter(id__in=product_ids, stock=0))
+    if sold_out:
+        invalidate_catalog()
+        search_index.update_products(sold_out)
+    invalidate_farmer_metrics(farmer_ids)
+
+
+def place_order(consumer, cart, shipping):
+    """
+    Turn a session cart into an Order.
+    `shipping` holds the Order fields from the checkout form
+    (full_name, mobile, address, pincode, payment_method).
+    Raises CartProblem if any line can't be bought; nothing is written then.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return _create_order(consumer, cart, shipping)
+        except OperationalError as e:
+            if not _is_lock_error(e) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(BACKOFF_BASE * (2 ** attempt) * (1 + random.random()))
@@ -0,0 +1,53 @@
+# store/dashboard.py
+# Farmer dashboard metrics.
+# The numbers are computed with database aggregates (no Python loops over
+# OrderItems) and cached per farmer. The cache entry is dropped whenever an
+# order is placed, the farmer fulfils items or one of the farmer's products changes.
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import OrderItem, Product
+
+METRICS_TIMEOUT = 60 * 60
+LOW_STOCK_LIMIT = 5
+
+
+def _metrics_key(farmer_id):
+    return f'store:farmer_metrics:{farmer_id}'
+
+
+def compute_farmer_metrics(farmer_id):
+    orders = OrderItem.objects.filter(product__farmer_id=farmer_id).aggregate(
+        pending_orders_count=Count('order', distinct=True, filter=Q(is_fulfilled=False)),
+        total_earnings=Coalesce(
+            Sum(F('price') * F('quantity'), filter=Q(is_fulfilled=True)),
+            0,
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+    )
+    products = Product.objects.filter(farmer_id=farmer_id)
+    live_products_count = products.filter(stock__gt=0, price__gt=0).count()
+    low_stock_products = list(
+        products.filter(stock__gt=0, stock__lte=LOW_STOCK_LIMIT).values('name', 'stock', 'unit')
+    )
+
+    return {
+        'live_products_count': live_products_count,
+        'low_stock_products': low_stock_products,
+        'pending_orders_count': orders['pending_orders_count'],
+        'total_earnings': orders['total_earnings'],
+    }
+
+
+def get_farmer_metrics(farmer_id):
+    key = _metrics_key(farmer_id)
+    metrics = cache.get(key)
+    if metrics is None:
+        metrics = compute_farmer_metrics(farmer_id)
+        cache.set(key, metrics, METRICS_TIMEOUT)
+    return metrics
+
+
+def invalidate_farmer_metrics(farmer_ids):
+    cache.delete_many([_metrics_key(farmer_id) for farmer_id in set(farmer_ids)])
@@ -0,0 +1,121 @@
+# store/delivery.py
+# Delivery runs for farmers.
+# Orders with items the farmer still has to deliver are grouped into one stop
+# per pincode and the stops are put in visiting order, from the farmer's own pincode:
+# nearest neighbour first, then 2-opt swaps while they shorten the run.
+# The whole run is then fulfilled in bulk (see store/fulfilment.py).
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from .models import OrderItem
+
+# Approximate pincode centroids (latitude, longitude). Stops in pincodes that
+# are not listed here can't be placed on the map and go at the end of the run.
+PINCODE_CENTROIDS = {
+    '380001': (23.0258, 72.5873),  # Ahmedabad GPO / Bhadra
+    '380006': (23.0216, 72.5662),  # Ellisbridge
+    '380007': (23.0106, 72.5646),  # Paldi
+    '380009': (23.0365, 72.5611),  # Navrangpura
+    '380013': (23.0500, 72.5530),  # Naranpura
+    '380015': (23.0300, 72.5170),  # Satellite / Vastrapur
+    '380051': (23.0040, 72.5170),  # Jodhpur / Vejalpur
+    '380052': (23.0510, 72.5340),  # Memnagar
+    '380054': (23.0450, 72.5100),  # Bodakdev / Thaltej
+    '380058': (23.0330, 72.4650),  # Bopal
+    '380061': (23.0660, 72.5420),  # Ghatlodia
+}
+EARTH_RADIUS_KM = 6371.0
+
+
+def distance_km(a, b):
+    """Great-circle distance between two (lat, lon) points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def plan_route(start, points):
+    """
+    Return the indices of `points` in visiting order for an open run from `start`
+    (nearest neighbour, improved with 2-opt).
+    """
+    remaining = set(range(len(points)))
+    route = []
+    current = start
+    while remaining:
+        nearest = min(remaining, key=lambda i: (distance_km(current, points[i]), i))
+        route.append(nearest)
+        remaining.remove(nearest)
+        current = points[nearest]
+
+    # 2-opt: reverse route[i..j] whenever that shortens the run
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(route) - 1):
+            for j in range(i + 1, len(route)):
+                before_i = start if i == 0 else points[route[i - 1]]
+                after_j = points[route[j + 1]] if j + 1 < len(route) else None
+                old = distance_km(before_i, points[route[i]])
+                new = distance_km(before_i, points[route[j]])
+                if after_j is not None:
+                    old += distance_km(points[route[j]], after_j)
+                    new += distance_km(points[route[i]], after_j)
+                if new < old - 1e-9:
+                    route[i:j + 1] = reversed(route[i:j + 1])
+                    improved = True
+    return route
+
+
+@dataclass
+class Stop:
+    pincode: str
+    orders: list = field(default_factory=list)  # [{'order', 'items': [OrderItem]}]
+    distance_km: float = None  # from the previous stop; None if the pincode isn't mapped
+
+
+@dataclass
+class DeliveryRun:
+    stops: list = field(default_factory=list)
+    total_km: float = 0.0
+
+    @property
+    def order_count(self):
+        return sum(len(stop.orders) for stop in self.stops)
+
+
+def plan_delivery_run(farmer):
+    """Group the orders with items the farmer still has to fulfil by pincode and order the stops."""
+    items = OrderItem.objects.filter(product__farmer=farmer, is_fulfilled=False).select_related(
+        'order', 'product'
+    ).only(
+        'quantity', 'order__id', 'order__order_date', 'order__full_name', 'order__mobile',
+        'order__address', 'order__pincode', 'product__name', 'product__unit',
+    ).order_by('order__order_date', 'id')
+
+    orders = {}  # order id -> {'order', 'items'}
+    for item in items:
+        orders.setdefault(item.order.id, {'order': item.order, 'items': []})['items'].append(item)
+
+    by_pincode = defaultdict(list)
+    for entry in orders.values():
+        by_pincode[entry['order'].pincode.strip()].append(entry)
+
+    mapped = sorted(pincode for pincode in by_pincode if pincode in PINCODE_CENTROIDS)
+    unmapped = sorted(pincode for pincode in by_pincode if pincode not in PINCODE_CENTROIDS)
+
+    run = DeliveryRun()
+    if mapped:
+        points = [PINCODE_CENTROIDS[pincode] for pincode in mapped]
+        start = PINCODE_CENTROIDS.get(farmer.pincode.strip(), points[0])
+        previous = start
+        for index in plan_route(start, points):
+            leg = distance_km(previous, points[index])
+            run.stops.append(Stop(mapped[index], by_pincode[mapped[index]], round(leg, 1)))
+            run.total_km += leg
+            previous = points[index]
+    run.stops.extend(Stop(pincode, by_pincode[pincode]) for pincode in unmapped)
+    run.total_km = round(run.total_km, 1)
+    return run
+
@@ -0,0 +1,151 @@
+# store/events.py
+# Order event bus.
+# - publish() writes an OrderEvent row inside the caller's transaction (an outbox),
+#   so an event exists exactly when the order change it describes was committed.
+# - Handlers are registered with @subscribe(...) and run by
+#   `manage.py process_order_events`, off the request path.
+# Events are delivered at least once (a failed or abandoned event is run again),
+# so every handler must be safe to run twice for the same event.
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .dashboard import LOW_STOCK_LIMIT
+from .ledger import record_delivery
+from .models import OrderEvent, OrderItem
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = {key for key, label in OrderEvent.EVENT_TYPE_CHOICES}
+MAX_ATTEMPTS = 5
+RETRY_BASE = 30  # seconds, doubled after every failed attempt
+CLAIM_TIMEOUT = timedelta(minutes=10)  # claims older than this are given back (worker died)
+
+_handlers = defaultdict(list)  # event_type -> [handler(event)]
+
+
+def _check_event_type(event_type):
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f'Unknown order event: {event_type}')
+
+
+def subscribe(event_type):
+    """Decorator registering handler(event) for an event type."""
+    _check_event_type(event_type)
+
+    def register(handler):
+        _handlers[event_type].append(handler)
+        return handler
+    return register
+
+
+def publish(event_type, order, **payload):
+    """Queue an event for `order`. Call it inside the transaction that changes the order."""
+    _check_event_type(event_type)
+    return OrderEvent.objects.create(
+        event_type=event_type, order=order, payload=payload, available_at=timezone.now()
+    )
+
+
+def publish_many(event_type, order_ids, **payload):
+    """publish() for many orders (by id) with one INSERT."""
+    _check_event_type(event_type)
+    now = timezone.now()
+    return OrderEvent.objects.bulk_create([
+        OrderEvent(event_type=event_type, order_id=order_id, payload=payload, available_at=now) for order_id in order_ids
+    ])
+
+
+# --- Worker side ---
+
+def claim_events(limit):
+    """Mark up to `limit` due events as processing and return them."""
+    now = timezone.now()
+    with transaction.atomic():
+        OrderEvent.objects.filter(status='processing', claimed_at__lt=now - CLAIM_TIMEOUT).update(status='pending')
+
+        ids = list(
+            OrderEvent.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', available_at__lte=now)
+            .order_by('available_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        # status='pending' again: another worker may have claimed some of them meanwhile
+        OrderEvent.objects.filter(id__in=ids, status='pending').update(
+            status='processing', claimed_at=now, attempts=F('attempts') + 1
+        )
+    return list(OrderEvent.objects.filter(id__in=ids, status='processing', claimed_at=now).select_related('order'))
+
+
+def _event_failed(event, error):
+    if event.attempts >= MAX_ATTEMPTS:
+        status, available_at = 'failed', event.available_at
+    else:
+        status = 'pending'
+        available_at = timezone.now() + timedelta(seconds=RETRY_BASE * 2 ** (event.attempts - 1))
+    OrderEvent.objects.filter(pk=event.pk).update(status=status, available_at=available_at, last_error=repr(error))
+
+
+def run_event(event):
+    """Run every handler of one claimed event and record the outcome."""
+    try:
+        for handler in _handlers[event.event_type]:
+            handler(event)
+    except Exception as e:
+        logger.exception('Order event %s (%s) failed', event.id, event.event_type)
+        _event_failed(event, e)
+    else:
+        OrderEvent.objects.filter(pk=event.pk).update(status='done', processed_at=timezone.now(), last_error='')
+
+
+def _run_event_in_thread(event):
+    try:
+        run_event(event)
+    finally:
+        # Every pool thread opens its own connection
+        connection.close()
+
+
+def process_events(batch_size=100, workers=4):
+    """Claim one batch of due events and run it. Returns the number of events run."""
+    events = claim_events(batch_size)
+    if workers <= 1:
+        for event in events:
+            run_event(event)
+    elif events:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_run_event_in_thread, events))
+    return len(events)
+
+
+# --- Handlers ---
+
+@subscribe('order_placed')
+def notify_farmers(event):
+    items = OrderItem.objects.filter(order_id=event.order_id).values_list('product__farmer_id', 'product__name', 'quantity')
+    by_farmer = defaultdict(list)
+    for farmer_id, name, quantity in items:
+        by_farmer[farmer_id].append(f'{quantity} x {name}')
+    for farmer_id, lines in by_farmer.items():
+        logger.info('New order %s for farmer %s: %s', event.order_id, farmer_id, ', '.join(lines))
+
+
+@subscribe('order_placed')
+def stock_alerts(event):
+    items = OrderItem.objects.filter(order_id=event.order_id, product__stock__lte=LOW_STOCK_LIMIT).values_list(
+        'product__farmer_id', 'product__name', 'product__stock'
+    )
+    for farmer_id, name, stock in items:
+        logger.warning('Low stock for farmer %s: %s has %s left', farmer_id, name, stock)
+
+
+@subscribe('items_fulfilled')
+@subscribe('order_delivered')
+def update_ledger(event):
+    # record_delivery() skips items that already have a ledger entry
+    record_delivery(event.order)
@@ -0,0 +1,81 @@
+# store/exports.py
+# Streaming exports of a farmer's order history (CSV or JSONL).
+# Rows are read with .iterator() and written one by one, so memory use stays
+# flat no matter how many years of orders a farmer has. Exports are read from a
+# replica when there is one (see store/routers.py).
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+
+from .ledger import split_amount
+from .routers import replica_alias
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+ORDER_COLUMNS = ['order_id', 'order_date', 'customer', 'pincode', 'product', 'quantity', 'unit', 'price', 'total', 'delivered']
+PAYOUT_COLUMNS = ['order_id', 'order_date', 'product', 'quantity', 'total', 'commission', 'farmer_amount', 'paid_out']
+
+
+class Echo:
+    # csv.writer needs a file; this one just hands the line back to the generator
+    def write(self, value):
+        return value
+
+
+def order_rows(items):
+    for item in items.using(replica_alias()).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            item.order.id,
+            item.order.order_date.isoformat(),
+            item.order.full_name,
+            item.order.pincode,
+            item.product.name,
+            item.quantity,
+            item.product.unit,
+            str(item.price),
+            str(item.price * item.quantity),
+            item.is_fulfilled,
+        ]
+
+
+def payout_rows(items):
+    for item in items.filter(is_fulfilled=True).using(replica_alias()).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        total = item.price * item.quantity
+        commission, farmer_amount = split_amount(total)
+        yield [
+            item.order.id,
+            item.order.order_date.isoformat(),
+            item.product.name,
+            item.quantity,
+            str(total),
+            str(commission),
+            str(farmer_amount),
+            item.is_paid_out,
+        ]
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _jsonl_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row))) + '\n'
+
+
+def streaming_export(columns, rows, fmt, filename):
+    if fmt == 'csv':
+        lines = _csv_lines(columns, rows)
+    else:
+        lines = _jsonl_lines(columns, rows)
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
@@ -0,0 +1,44 @@
+# store/fulfilment.py
+# Order fulfilment.
+# Every farmer fulfils only their own OrderItems; an Order rolls up to
+# delivered once all of its items are fulfilled. Marking any number of orders
+# is a fixed handful of set-based queries (no per-order get/exists/save).
+from django.db import transaction
+from django.utils import timezone
+
+from .events import publish_many
+from .models import Order, OrderItem
+
+MAX_FULFIL_ORDERS = 500
+
+
+def fulfil_orders(farmer, order_ids):
+    """
+    Mark the farmer's unfulfilled items in the given orders as fulfilled and
+    mark every order whose items are now all fulfilled as delivered.
+    Returns (fulfilled_order_ids, delivered_order_ids).
+    """
+    with transaction.atomic():
+        touched = sorted(set(
+            OrderItem.objects.filter(order_id__in=order_ids, product__farmer=farmer, is_fulfilled=False)
+            .values_list('order_id', flat=True)
+        ))
+        if not touched:
+            return [], []
+
+        OrderItem.objects.filter(order_id__in=touched, product__farmer=farmer, is_fulfilled=False).update(
+            is_fulfilled=True, fulfilled_at=timezone.now()
+        )
+
+        delivered = list(
+            Order.objects.filter(id__in=touched, is_delivered=False)
+            .exclude(items__is_fulfilled=False)
+            .values_list('id', flat=True)
+        )
+        if delivered:
+            Order.objects.filter(id__in=delivered).update(is_delivered=True)
+
+        # Ledger entries etc. are written by the event worker (see store/events.py)
+        publish_many('items_fulfilled', touched, farmer_id=farmer.id)
+        publish_many('order_delivered', delivered)
+    return touched, delivered
@@ -0,0 +1,87 @@
+# store/images.py
+# Responsive product images.
+# `manage.py build_product_thumbnails` writes WebP + JPEG copies of every product
+# photo at a few widths into settings.PRODUCT_THUMBNAIL_DIR (served as static
+# files under thumbs/) and records them in a manifest. Every variant file name
+# carries a hash of the source photo, so its URL changes whenever the photo does
+# and browsers can cache it for good. The {% product_image %} tag reads the manifest.
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+THUMBNAIL_PREFIX = 'thumbs'  # static URL prefix of PRODUCT_THUMBNAIL_DIR
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_CHECK_INTERVAL = 5  # seconds between checks for a rebuilt manifest
+FORMATS = {
+    # format -> (file extension, Pillow save options)
+    'webp': ('webp', {'quality': 78, 'method': 6}),
+    'jpeg': ('jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+
+def thumbnail_dir():
+    return Path(settings.PRODUCT_THUMBNAIL_DIR)
+
+
+def manifest_path():
+    return thumbnail_dir() / MANIFEST_NAME
+
+
+def source_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def variant_name(image_path, digest, width, fmt):
+    """Static path of one variant, e.g. thumbs/Products/fruits/apple.3f2a9c1e0b4d.320.webp"""
+    stem = os.path.splitext(image_path)[0]
+    return f'{THUMBNAIL_PREFIX}/{stem}.{digest}.{width}.{FORMATS[fmt][0]}'
+
+
+def write_manifest(manifest):
+    path = manifest_path()
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+    os.replace(tmp, path)  # readers never see half a manifest
+
+
+# --- Manifest for the template tags (re-read when the command rebuilds it) ---
+
+_manifest_lock = threading.Lock()
+_manifest = {'data': {}, 'mtime': None, 'checked_at': 0}
+
+
+def load_manifest():
+    """{image_path: {'hash', 'width', 'height', 'variants': {fmt: [[width, static path], ...]}}}"""
+    now = time.monotonic()
+    if now - _manifest['checked_at'] < MANIFEST_CHECK_INTERVAL:
+        return _manifest['data']
+
+    with _manifest_lock:
+        _manifest['checked_at'] = now
+        try:
+            mtime = manifest_path().stat().st_mtime
+        except OSError:
+            _manifest.update(data={}, mtime=None)
+            return _manifest['data']
+        if mtime != _manifest['mtime']:
+            try:
+                data = json.loads(manifest_path().read_text())
+            except (OSError, ValueError):
+                data = {}
+            _manifest.update(data=data, mtime=mtime)
+    return _manifest['data']
+
+
+def manifest_version():
+    """Changes whenever the manifest is rebuilt (part of the card cache keys)."""
+    load_manifest()
+    return _manifest['mtime']
@@ -0,0 +1,160 @@
+# store/inventory.py
+# Farmer inventory management.
+# - Onboarding: products from the taxonomy registry are added with one query to
+#   diff against the current inventory and one bulk_create().
+# - Bulk price / unit / stock editing: a whole batch of changes is validated
+#   together and written with one bulk_update() inside one transaction.
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .catalog import invalidate_catalog
+from .dashboard import invalidate_farmer_metrics
+from .models import Product
+from .search import search_index
+from .taxonomy import lookup
+
+MAX_BATCH_SIZE = 1000
+UNITS = {key for key, label in Product.UNIT_CHOICES}
+CSV_COLUMNS = ('product_id', 'price', 'unit', 'stock')
+# What the price and stock columns can hold; bigger values would be stored but
+# break every later read of the product (or overflow the column)
+_price_field = Product._meta.get_field('price')
+MAX_PRICE = Decimal(10) ** (_price_field.max_digits - _price_field.decimal_places)
+MAX_STOCK = connection.ops.integer_field_range('PositiveIntegerField')[1]
+
+
+class InventoryBatchError(ValueError):
+    pass
+
+
+def onboard_products(farmer, names):
+    """
+    Add the named products to the farmer's inventory (price and stock 0, so they
+    start as drafts). Names already in the inventory are skipped.
+    Returns the list of created products.
+    """
+    existing = set(Product.objects.filter(farmer=farmer).values_list('name', flat=True))
+
+    to_create = {}
+    for name in names:
+        product_type = lookup(name)
+        if product_type.name not in existing and product_type.name not in to_create:
+            to_create[product_type.name] = Product(
+                farmer=farmer,
+                name=product_type.name,
+                category=product_type.category,
+                price=0,
+                stock=0,
+                unit=product_type.default_unit,
+                image_path=product_type.image_path,
+            )
+
+    return Product.objects.bulk_create(list(to_create.values()))
+
+
+def parse_csv_changes(uploaded_file):
+    """Read (product_id, price, unit, stock) rows from an uploaded CSV file."""
+    try:
+        text = uploaded_file.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise InventoryBatchError('The CSV file must be UTF-8 encoded.')
+
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise InventoryBatchError(f'Missing CSV column(s): {", ".join(missing)}.')
+    return [{column: (row.get(column) or '').strip() for column in CSV_COLUMNS} for row in reader]
+
+
+def _validate_row(row, product):
+    errors = []
+    if product is None:
+        return None, ['Product not found in your inventory.']
+
+    try:
+        price = Decimal(str(row.get('price')))
+        if not price.is_finite() or not 0 <= price < MAX_PRICE:
+            raise InvalidOperation
+        price = price.quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        errors.append(f'Price must be a number from 0 to less than {MAX_PRICE}.')
+        price = None
+
+    unit = row.get('unit') or product.unit
+    if unit not in UNITS:
+        errors.append(f'Unit must be one of: {", ".join(sorted(UNITS))}.')
+
+    try:
+        stock = int(row.get('stock'))
+        if not 0 <= stock <= MAX_STOCK:
+            raise ValueError
+    except (TypeError, ValueError, OverflowError):
+        errors.append(f'Stock must be a whole number from 0 to {MAX_STOCK}.')
+        stock = None
+
+    if errors:
+        return None, errors
+    return {'price': price, 'unit': unit, 'stock': stock}, []
+
+
+def apply_inventory_changes(farmer, rows):
+    """
+    Validate and apply a batch of {'product_id', 'price', 'unit', 'stock'} rows.
+    Returns (applied, results) where results has one entry per input row.
+    Nothing is written unless every row is valid.
+    """
+    if not rows:
+        raise InventoryBatchError('No changes were sent.')
+    if len(rows) > MAX_BATCH_SIZE:
+        raise InventoryBatchError(f'At most {MAX_BATCH_SIZE} products can be updated at once.')
+
+    ids = set()
+    for row in rows:
+        try:
+            ids.add(int(row.get('product_id')))
+        except (TypeError, ValueError):
+            pass
+    products = Product.objects.filter(farmer=farmer).in_bulk(list(ids))
+
+    results = []
+    changed = {}
+    for row in rows:
+        try:
+            product = products.get(int(row.get('product_id')))
+        except (TypeError, ValueError):
+            product = None
+
+        values, errors = _validate_row(row, product)
+        if not errors and product.id in changed:
+            errors = ['Product appears more than once in this batch.']
+        if errors:
+            results.append({'product_id': row.get('product_id'), 'status': 'error', 'errors': errors})
+            continue
+
+        for field_name, value in values.items():
+            setattr(product, field_name, value)
+        changed[product.id] = product
+        results.append({'product_id': product.id, 'status': 'ok', 'name': product.name})
+
+    if any(result['status'] == 'error' for result in results):
+        # Valid rows are reported as not applied, so the farmer can fix and resend
+        for result in results:
+            if result['status'] == 'ok':
+                result['status'] = 'not_applied'
+        return False, results
+
+    now = timezone.now()
+    for product in changed.values():
+        product.updated_at = now
+    with transaction.atomic():
+        Product.objects.bulk_update(list(changed.values()), ['price', 'unit', 'stock', 'updated_at'])
+
+    # bulk_update() skips the save signals
+    invalidate_catalog()
+    search_index.update_products(changed.values())
+    invalidate_farmer_metrics([farmer.id])
+    return True, results
@@ -0,0 +1,192 @@
+# store/ledger.py
+# Farmer ledger: earnings are written once when an order item is fulfilled,
+# settlement is one transaction over the ledger instead of a rescan of OrderItems.
+# Admins pay out many approved farmers at once with settle_farmers() (the
+# "Pay out" admin action and `manage.py run_payouts`), which writes a CSV report.
+import csv
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.utils import timezone
+
+from .models import Farmer, FarmerLedger, LedgerEntry, OrderItem
+
+COMMISSION_RATE = Decimal('0.15')  # 15% commission
+CENT = Decimal('0.01')
+
+
+def split_amount(gross):
+    """Return (commission, net) for a gross amount."""
+    commission = (gross * COMMISSION_RATE).quantize(CENT, rounding=ROUND_HALF_UP)
+    return commission, gross - commission
+
+
+def get_ledger(farmer):
+    return FarmerLedger.objects.get_or_create(farmer=farmer)[0]
+
+
+def record_delivery(order):
+    """
+    Write an earning entry for every fulfilled item of an order and add them to
+    each farmer's unpaid balance. Items that already have an entry are skipped,
+    so calling this twice for the same order is harmless.
+    """
+    with transaction.atomic():
+        items = OrderItem.objects.filter(
+            order=order, is_fulfilled=True, ledger_entry__isnull=True
+        ).select_related('product')
+
+        entries = defaultdict(list)  # farmer_id -> [LedgerEntry]
+        for item in items:
+            gross = item.price * item.quantity
+            commission, net = split_amount(gross)
+            entries[item.product.farmer_id].append(
+                LedgerEntry(order_item=item, gross=gross, commission=commission, net=net)
+            )
+
+        for farmer_id, farmer_entries in entries.items():
+            ledger = FarmerLedger.objects.get_or_create(farmer_id=farmer_id)[0]
+            for entry in farmer_entries:
+                entry.ledger = ledger
+            LedgerEntry.objects.bulk_create(farmer_entries)
+
+            FarmerLedger.objects.filter(pk=ledger.pk).update(
+                unpaid_gross=F('unpaid_gross') + sum(entry.gross for entry in farmer_entries),
+                unpaid_commission=F('unpaid_commission') + sum(entry.commission for entry in farmer_entries),
+                unpaid_net=F('unpaid_net') + sum(entry.net for entry in farmer_entries),
+                unpaid_items=F('unpaid_items') + len(farmer_entries),
+            )
+
+
+def unsettled_entries(ledger):
+    return LedgerEntry.objects.filter(ledger=ledger, entry_type='earning', settlement__isnull=True)
+
+
+def settle_ledger(farmer):
+    """
+    Pay out the farmer's whole unpaid balance in one transaction.
+    Returns the payout LedgerEntry, or None if there was nothing to pay.
+    """
+    with transaction.atomic():
+        ledger = FarmerLedger.objects.select_for_update().get(farmer=farmer)
+        if not ledger.unpaid_items:
+            return None
+
+        payout = LedgerEntry.objects.create(
+            ledger=ledger,
+            entry_type='payout',
+            gross=ledger.unpaid_gross,
+            commission=ledger.unpaid_commission,
+            net=ledger.unpaid_net,
+        )
+        entries = unsettled_entries(ledger).exclude(pk=payout.pk)
+        OrderItem.objects.filter(ledger_entry__in=entries).update(is_paid_out=True)
+        entries.update(settlement=payout)
+
+        ledger.total_paid_out = F('total_paid_out') + ledger.unpaid_net
+        ledger.unpaid_gross = ledger.unpaid_commission = ledger.unpaid_net = 0
+        ledger.unpaid_items = 0
+        ledger.save()
+
+        farmer.payout_status = 'none'
+        farmer.save(update_fields=['payout_status'])
+    return payout
+
+
+# --- Payout batches ---
+
+PAYOUT_CHUNK_SIZE = 50  # farmers settled per transaction
+PAYOUT_REPORT_COLUMNS = ['farmer_id', 'farmer', 'kisan_id', 'status', 'payout_id', 'items', 'gross', 'commission', 'net']
+
+
+def settle_farmers(farmers, chunk_size=PAYOUT_CHUNK_SIZE, progress=None):
+    """
+    Pay out every farmer of the queryset whose payout is approved, `chunk_size`
+    farmers per transaction. Returns one report row (a dict) per farmer, with
+    status 'paid', 'nothing to pay' or 'mismatch'. progress(done, total) is
+    called after every chunk.
+    """
+    farmer_ids = list(farmers.filter(payout_status='approved').order_by('id').values_list('id', flat=True))
+    rows = []
+    for start in range(0, len(farmer_ids), chunk_size):
+        rows += _settle_chunk(farmer_ids[start:start + chunk_size])
+        if progress:
+            progress(min(start + chunk_size, len(farmer_ids)), len(farmer_ids))
+    return rows
+
+
+def _unsettled_of(ledger_ids):
+    return LedgerEntry.objects.filter(ledger_id__in=ledger_ids, entry_type='earning', settlement__isnull=True)
+
+
+def _settle_chunk(farmer_ids):
+    with transaction.atomic():
+        ledgers = {
+            ledger.farmer_id: ledger
+            for ledger in FarmerLedger.objects.select_for_update(of=('self',)).filter(farmer_id__in=farmer_ids)
+        }
+        # The balances are summed from the unsettled earnings, one grouped query
+        # for the whole chunk, and checked against the running ledger totals
+        balances = {
+            row['ledger_id']: row
+            for row in _unsettled_of([ledger.id for ledger in ledgers.values()]).order_by().values('ledger_id').annotate(
+                items=Count('id'), gross=Sum('gross'), commission=Sum('commission'), net=Sum('net'),
+            )
+        }
+
+        rows, done = [], []
+        payouts = {}  # ledger id -> (payout entry, report row)
+        for farmer in Farmer.objects.filter(id__in=farmer_ids).select_related('user').order_by('id'):
+            ledger = ledgers.get(farmer.id)
+            balance = balances.get(ledger.id) if ledger else None
+            row = {'farmer_id': farmer.id, 'farmer': farmer.user.username, 'kisan_id': farmer.kisan_id,
+                   'status': 'nothing to pay', 'payout_id': None, 'items': 0, 'gross': 0, 'commission': 0, 'net': 0}
+            rows.append(row)
+            if balance is None:
+                done.append(farmer.id)
+                continue
+            row.update(items=balance['items'], **{field: balance[field].quantize(CENT) for field in ('gross', 'commission', 'net')})
+            if (row['items'], row['net']) != (ledger.unpaid_items, ledger.unpaid_net):
+                # Left approved and unpaid for an admin to look at
+                row['status'] = 'mismatch'
+                continue
+            row['status'] = 'paid'
+            payouts[ledger.id] = (LedgerEntry(ledger=ledger, entry_type='payout', gross=row['gross'],
+                                              commission=row['commission'], net=row['net']), row)
+            done.append(farmer.id)
+
+        if payouts:
+            LedgerEntry.objects.bulk_create([payout for payout, row in payouts.values()])
+            entries = _unsettled_of(payouts.keys())
+            OrderItem.objects.filter(ledger_entry__in=entries).update(is_paid_out=True)
+            entries.update(settlement=Case(*(When(ledger_id=ledger_id, then=Value(payout.pk))
+                                             for ledger_id, (payout, row) in payouts.items())))
+            for payout, row in payouts.values():
+                row['payout_id'] = payout.pk
+
+            paid = [ledger for ledger in ledgers.values() if ledger.id in payouts]
+            now = timezone.now()
+            for ledger in paid:
+                ledger.total_paid_out += ledger.unpaid_net
+                ledger.unpaid_gross = ledger.unpaid_commission = ledger.unpaid_net = 0
+                ledger.unpaid_items = 0
+                ledger.updated_at = now  # bulk_update skips auto_now
+            FarmerLedger.objects.bulk_update(
+                paid, ['total_paid_out', 'unpaid_gross', 'unpaid_commission', 'unpaid_net', 'unpaid_items', 'updated_at'],
+            )
+
+        Farmer.objects.filter(id__in=done).update(payout_status='none')
+    return rows
+
+
+def write_payout_report(rows, file):
+    """Write settle_farmers() rows as CSV to a file(-like) object, with a total line."""
+    writer = csv.DictWriter(file, fieldnames=PAYOUT_REPORT_COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+    paid = [row for row in rows if row['status'] == 'paid']
+    writer.writerow({'farmer': 'TOTAL', 'status': f'{len(paid)} paid',
+                     'items': sum(row['items'] for row in paid),
+                     **{column: sum((row[column] for row in paid), Decimal(0)) for column in ('gross', 'commission', 'net')}})
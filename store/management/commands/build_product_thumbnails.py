@@ -0,0 +1,86 @@
+# store/management/commands/build_product_thumbnails.py
+# Resize every product photo to WebP + JPEG thumbnails (see store/images.py).
+#   python manage.py build_product_thumbnails            # only new / changed photos
+#   python manage.py build_product_thumbnails --force    # redo everything
+# Needs Pillow (pip install Pillow). Run it before `collectstatic` when deploying.
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+
+from store.images import FORMATS, load_manifest, source_hash, thumbnail_dir, variant_name, write_manifest
+from store.models import Product
+from store.taxonomy import DEFAULT_IMAGE, PRODUCT_IMAGE_MAP
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive WebP/JPEG thumbnails of the product images and their manifest.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild thumbnails of unchanged images too.')
+
+    def handle(self, *args, **options):
+        try:
+            from PIL import Image, ImageOps
+        except ImportError:
+            raise CommandError('Pillow is required: pip install Pillow')
+
+        image_paths = set(PRODUCT_IMAGE_MAP.values()) | {DEFAULT_IMAGE}
+        image_paths |= {path for path in Product.objects.values_list('image_path', flat=True).distinct() if path}
+
+        widths = sorted(settings.PRODUCT_THUMBNAIL_WIDTHS)
+        out_dir = thumbnail_dir()
+        out_dir.mkdir(parents=True, exist_ok=True)
+        old_manifest = {} if options['force'] else load_manifest()
+        manifest, built, missing = {}, 0, []
+
+        for image_path in sorted(image_paths):
+            source = finders.find(image_path)
+            if not source:
+                missing.append(image_path)
+                continue
+
+            digest = source_hash(source)
+            entry = old_manifest.get(image_path)
+            if entry and entry['hash'] == digest and self._files_exist(entry):
+                manifest[image_path] = entry
+                continue
+
+            with Image.open(source) as image:
+                image = self._to_rgb(ImageOps.exif_transpose(image), Image)
+                # Never upscale; a photo smaller than every width gets one variant at its own size
+                sizes = [width for width in widths if width < image.width] or [image.width]
+                entry = {'hash': digest, 'width': image.width, 'height': image.height, 'variants': {}}
+                for fmt, (extension, save_options) in FORMATS.items():
+                    entry['variants'][fmt] = []
+                    for width in sizes:
+                        height = round(image.height * width / image.width)
+                        name = variant_name(image_path, digest, width, fmt)
+                        target = out_dir / name.split('/', 1)[1]
+                        target.parent.mkdir(parents=True, exist_ok=True)
+                        image.resize((width, height), Image.LANCZOS).save(target, fmt.upper(), **save_options)
+                        entry['variants'][fmt].append([width, name])
+            manifest[image_path] = entry
+            built += 1
+
+        write_manifest(manifest)
+        for image_path in missing:
+            self.stderr.write(f'Image not found in the static files: {image_path}')
+        self.stdout.write(f'Thumbnails built for {built} image(s), {len(manifest) - built} unchanged.')
+
+    def _to_rgb(self, image, Image):
+        if image.mode not in ('RGBA', 'LA') and 'transparency' not in image.info:
+            return image.convert('RGB')
+        # JPEG has no alpha, and a plain convert() turns transparent areas (the
+        # logo fallback) black: flatten onto white like the cards' background
+        rgba = image.convert('RGBA')
+        flat = Image.new('RGB', rgba.size, 'white')
+        flat.paste(rgba, mask=rgba.getchannel('A'))
+        return flat
+
+    def _files_exist(self, entry):
+        out_dir = thumbnail_dir()
+        return all(
+            (out_dir / name.split('/', 1)[1]).exists()
+            for variants in entry['variants'].values()
+            for width, name in variants
+        )
@@ -0,0 +1,34 @@
+# store/management/commands/process_order_events.py
+# Worker for the order event outbox (see store/events.py).
+#   python manage.py process_order_events            # keep running
+#   python manage.py process_order_events --once     # drain what is due, then exit
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.events import process_events
+
+
+class Command(BaseCommand):
+    help = 'Run the handlers of queued order events (order_placed, order_delivered).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when no event is due instead of waiting.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Events claimed per batch.')
+        parser.add_argument('--workers', type=int, default=4, help='Threads running handlers.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to wait when the queue is empty.')
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                done = process_events(batch_size=options['batch_size'], workers=options['workers'])
+                total += done
+                if done:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f'Processed {total} order event(s).')
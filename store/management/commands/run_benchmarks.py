@@ -0,0 +1,125 @@
+# store/management/commands/run_benchmarks.py
+# Latency / query / allocation benchmarks of the hot endpoints (see store/benchmarks.py).
+#   python manage.py run_benchmarks --output benchmarks/base.json
+#   python manage.py run_benchmarks --baseline benchmarks/base.json --fail-on-regression
+#   DATABASE_PROFILE=sqlite-plain python manage.py run_benchmarks --threads 8 --output plain.json
+#   python manage.py run_benchmarks --threads 8 --baseline plain.json     # compare database profiles
+# Runs in a throw-away test database seeded by store/seed.py, so it never
+# touches real data and every run starts from the same rows. Clears the cache.
+# With --url it instead loads a running server over HTTP, which must use this
+# configuration's database, seeded first with `manage.py seed_marketplace`:
+#   gunicorn connectfarma_project1.wsgi -w 4 --threads 4 &
+#   python manage.py run_benchmarks --url http://127.0.0.1:8000 --connections 200 --slow-ms 200 --output wsgi.json
+#   uvicorn connectfarma_project1.asgi:application --workers 4 &
+#   python manage.py run_benchmarks --url http://127.0.0.1:8000 --connections 200 --slow-ms 200 --baseline wsgi.json
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from store.benchmarks import (
+    DEFAULT_THRESHOLD, HTTP_SCENARIOS, SCENARIOS, compare_reports, run_benchmarks, run_http_load,
+)
+from store.seed import seed_marketplace
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot store endpoints against a seeded test database and report p50/p95/p99 latency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                            help=f'Default: all of {", ".join(SCENARIOS)} (with --url: {", ".join(HTTP_SCENARIOS)}).')
+        parser.add_argument('--iterations', type=int, default=100, help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per scenario first.')
+        parser.add_argument('--profile-iterations', type=int, default=10,
+                            help='Extra requests per scenario counting queries and allocations.')
+        parser.add_argument('--threads', type=int, default=0,
+                            help='Also run concurrent checkouts and catalog reads on this many threads.')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of the concurrent run (per scenario with --url).')
+        parser.add_argument('--url', help='Load this running server over HTTP instead, e.g. http://127.0.0.1:8000.')
+        parser.add_argument('--connections', type=int, default=50, help='Concurrent connections with --url.')
+        parser.add_argument('--slow-ms', type=int, default=0,
+                            help='With --url, pause this long in the middle of every request, like a slow mobile client.')
+        parser.add_argument('--farmers', type=int, default=20)
+        parser.add_argument('--products-per-farmer', type=int, default=15)
+        parser.add_argument('--consumers', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--output', help='Save the report as JSON here.')
+        parser.add_argument('--baseline', help='Compare with a report saved earlier.')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Allowed slowdown before a metric counts as a regression (0.2 = 20%%).')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error on any regression.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text())
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read the baseline: {e}')
+
+        if options['url']:
+            try:
+                report = run_http_load(options['url'], options['scenarios'], connections=options['connections'],
+                                       seconds=options['seconds'], slow_ms=options['slow_ms'])
+            except ValueError as e:
+                raise CommandError(e)
+        else:
+            report = self._run_in_test_database(options)
+
+        self._print_report(report)
+        if options['output']:
+            path = Path(options['output'])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(report, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(f'Saved to {path}')
+
+        if baseline is not None:
+            regressions = compare_reports(baseline, report, options['threshold'])
+            for name, metric, before, after in regressions:
+                self.stdout.write(self.style.ERROR(f'REGRESSION {name} {metric}: {before} -> {after}'))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline.get("commit") or options["baseline"]}.'))
+            elif options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} regression(s).')
+
+    def _run_in_test_database(self, options):
+        seed = {name: options[name] for name in ('farmers', 'products_per_farmer', 'consumers', 'orders')}
+        tmp_dir = None
+        if connection.vendor == 'sqlite':
+            # A file, not SQLite's default in-memory test database, so journal
+            # mode and locking behave as they do in production
+            tmp_dir = tempfile.mkdtemp(prefix='store-benchmark-')
+            connection.settings_dict['TEST']['NAME'] = str(Path(tmp_dir) / 'benchmark.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # Like the test runner: production-like DEBUG, and the test client's host allowed
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                self.stdout.write('Seeding: ' + ', '.join(f'{count} {name}' for name, count in seed_marketplace(**seed).items()))
+                report = run_benchmarks(
+                    options['scenarios'], iterations=options['iterations'],
+                    warmup=options['warmup'], profile_iterations=options['profile_iterations'],
+                    threads=options['threads'], seconds=options['seconds'],
+                )
+        except ValueError as e:
+            raise CommandError(e)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        report['seed'] = seed
+        return report
+
+    def _print_report(self, report):
+        columns = ('p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'queries', 'alloc_kib', 'throughput_rps', 'errors')
+        if 'server' in report:
+            self.stdout.write(f'Server: {report["server"]}, {report["connections"]} connections, slow clients: {report["slow_ms"]} ms')
+        self.stdout.write(f'Database profile: {report["database_profile"]}')
+        self.stdout.write(f'{"scenario":<22}' + ''.join(f'{column:>15}' for column in columns))
+        for name, result in report['scenarios'].items():
+            self.stdout.write(f'{name:<22}' + ''.join(f'{result.get(column, "")!s:>15}' for column in columns))
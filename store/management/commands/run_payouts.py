@@ -0,0 +1,36 @@
+# store/management/commands/run_payouts.py
+# Payout batch: settle every farmer whose payout an admin approved (see
+# settle_farmers in store/ledger.py) and write the settlement report.
+#   python manage.py run_payouts                          # report: payouts-<date>.csv
+#   python manage.py run_payouts --output reports/payouts.csv --chunk-size 100
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.ledger import PAYOUT_CHUNK_SIZE, settle_farmers, write_payout_report
+from store.models import Farmer
+
+
+class Command(BaseCommand):
+    help = 'Pay out all farmers with an approved payout and write a CSV settlement report.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Report path. Default: payouts-<date>-<time>.csv')
+        parser.add_argument('--chunk-size', type=int, default=PAYOUT_CHUNK_SIZE, help='Farmers settled per transaction.')
+
+    def handle(self, *args, **options):
+        rows = settle_farmers(
+            Farmer.objects.all(), chunk_size=options['chunk_size'],
+            progress=lambda done, total: self.stdout.write(f'Settled {done} of {total} farmers'),
+        )
+        path = Path(options['output'] or f'payouts-{timezone.now():%Y%m%d-%H%M%S}.csv')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('w', newline='') as file:
+            write_payout_report(rows, file)
+
+        paid = [row for row in rows if row['status'] == 'paid']
+        self.stdout.write(f'{len(paid)} farmers paid ₹{sum(row["net"] for row in paid):.2f}. Report: {path}')
+        mismatches = [row['farmer'] for row in rows if row['status'] == 'mismatch']
+        if mismatches:
+            self.stdout.write(self.style.WARNING(f'Ledger totals disagree, not paid: {", ".join(mismatches)}'))
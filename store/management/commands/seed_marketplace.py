@@ -0,0 +1,45 @@
+# store/management/commands/seed_marketplace.py
+# Fill the database with a synthetic marketplace (see store/seed.py).
+#   python manage.py seed_marketplace --farmers 100 --orders 20000
+#   python manage.py seed_marketplace --clear        # remove the seeded rows again
+# Seeded users log in with their user name (e.g. seed-consumer0@example.com) and SEED_PASSWORD.
+from django.core.management.base import BaseCommand, CommandError
+
+from store.seed import SEED_PASSWORD, clear_seeded_marketplace, seed_marketplace, seeded_users
+
+
+class Command(BaseCommand):
+    help = 'Create synthetic farmers, consumers, products and historical orders for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farmers', type=int, default=50)
+        parser.add_argument('--products-per-farmer', type=int, default=20)
+        parser.add_argument('--consumers', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=5000, help='Historical orders, 80%% of them delivered.')
+        parser.add_argument('--items-per-order', type=int, default=3, help='Most items in one order.')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--clear', action='store_true', help='Only delete a previously seeded marketplace.')
+        parser.add_argument('--replace', action='store_true', help='Delete a previously seeded marketplace first.')
+
+    def handle(self, *args, **options):
+        if options['clear'] or options['replace']:
+            count = seeded_users().count()
+            clear_seeded_marketplace()
+            self.stdout.write(f'Deleted {count} seeded user(s) and their data.')
+            if options['clear']:
+                return
+
+        try:
+            created = seed_marketplace(
+                farmers=options['farmers'],
+                products_per_farmer=options['products_per_farmer'],
+                consumers=options['consumers'],
+                orders=options['orders'],
+                items_per_order=options['items_per_order'],
+                seed=options['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(f'{e} Use --replace or --clear.')
+
+        self.stdout.write(', '.join(f'{count} {name}' for name, count in created.items()))
+        self.stdout.write(f'Seeded users log in with the password "{SEED_PASSWORD}".')
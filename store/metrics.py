@@ -0,0 +1,141 @@
+# store/metrics.py
+# Per-view request metrics (filled by store.middleware.RequestMetricsMiddleware).
+# Every request adds its wall time to a histogram of its URL name. A sample of
+# requests (settings.REQUEST_METRICS_SAMPLE_RATE) also has every DB query
+# counted and timed through connection.execute_wrapper, is checked for
+# duplicate and N+1 queries and is logged as one JSON line. The histograms
+# live in process memory (one set per worker process) and are served in the
+# Prometheus text format by /metrics/.
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+# Upper bounds of the histogram buckets
+DURATION_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+# The same query shape this many times in one request looks like a loop over rows
+N_PLUS_ONE_MIN = 5
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+SPACE_RE = re.compile(r'\s+')
+
+
+def query_shape(sql):
+    """SQL with IN lists and inlined numbers collapsed, so one loop's queries are equal."""
+    return SPACE_RE.sub(' ', NUMBER_RE.sub('N', IN_LIST_RE.sub('IN (...)', sql))).strip()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    # name -> (type, help, bucket bounds for histograms)
+    METRICS = {
+        'store_request_duration_ms': ('histogram', 'Wall time of requests per URL name.', DURATION_BUCKETS_MS),
+        'store_db_queries': ('histogram', 'DB queries per sampled request.', QUERY_COUNT_BUCKETS),
+        'store_db_time_ms': ('histogram', 'DB time per sampled request.', DURATION_BUCKETS_MS),
+        'store_duplicate_queries_total': ('counter', 'Identical queries repeated within one sampled request.', None),
+        'store_n_plus_one_requests_total': ('counter', 'Sampled requests with an N+1 query pattern.', None),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._data = {
+                name: defaultdict(lambda buckets=buckets: Histogram(buckets)) if kind == 'histogram' else Counter()
+                for name, (kind, help_text, buckets) in self.METRICS.items()
+            }
+
+    def observe_request(self, view, duration_ms):
+        with self._lock:
+            self._data['store_request_duration_ms'][view].observe(duration_ms)
+
+    def observe_queries(self, view, recorder):
+        with self._lock:
+            self._data['store_db_queries'][view].observe(recorder.count)
+            self._data['store_db_time_ms'][view].observe(recorder.time_ms)
+            self._data['store_duplicate_queries_total'][view] += recorder.duplicates()
+            self._data['store_n_plus_one_requests_total'][view] += bool(recorder.n_plus_one())
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, buckets) in self.METRICS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                for view, value in sorted(self._data[name].items()):
+                    if kind == 'counter':
+                        lines.append(f'{name}{{view="{view}"}} {value}')
+                        continue
+                    lines += [f'{name}_bucket{{view="{view}",le="{bound}"}} {count}' for bound, count in value.cumulative()]
+                    lines.append(f'{name}_sum{{view="{view}"}} {round(value.sum, 3)}')
+                    lines.append(f'{name}_count{{view="{view}"}} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics_registry = MetricsRegistry()
+
+
+# --- Query recording (sampled requests only) ---
+
+class QueryRecorder:
+    """An execute_wrapper that counts and times queries and remembers their shapes."""
+
+    def __init__(self):
+        self.count = 0
+        self.time_ms = 0.0
+        self.shapes = Counter()
+        self.exact = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time_ms += (time.perf_counter() - started) * 1000
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+            self.exact[(sql, repr(params))] += 1
+
+    def duplicates(self):
+        """Number of queries that repeated an earlier query exactly (same SQL and params)."""
+        return sum(count - 1 for count in self.exact.values() if count > 1)
+
+    def n_plus_one(self):
+        """[(query shape, times)] for shapes run at least N_PLUS_ONE_MIN times."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= N_PLUS_ONE_MIN]
+
+
+@contextmanager
+def record_queries():
+    """Record the queries of every database connection of this thread."""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
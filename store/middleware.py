@@ -0,0 +1,92 @@
+# store/middleware.py
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from .metrics import metrics_registry, record_queries
+
+logger = logging.getLogger('store.metrics')
+
+
+def _view_name(request):
+    # The URL name from store/urls.py (set once the URL is resolved)
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '<unmatched>'
+
+
+class RequestMetricsMiddleware:
+    """
+    Time every request per URL name (see store/metrics.py). Only sampled requests
+    (settings.REQUEST_METRICS_SAMPLE_RATE, 0 to 1) pay for recording their queries;
+    the rest cost two clock reads and a histogram update. Streaming responses
+    (the exports) are timed until the response is returned, not fully sent.
+    Works sync and async, so under ASGI the async views stay on the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _sample(self):
+        sample_rate = getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 0)
+        return sample_rate and random.random() < sample_rate
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        started = time.perf_counter()
+        if not self._sample():
+            response = self.get_response(request)
+            metrics_registry.observe_request(_view_name(request), (time.perf_counter() - started) * 1000)
+            return response
+
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        self._sampled(request, response, started, recorder)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        if not self._sample():
+            response = await self.get_response(request)
+            metrics_registry.observe_request(_view_name(request), (time.perf_counter() - started) * 1000)
+            return response
+
+        # Connections belong to threads: the ORM calls of an async request run
+        # on its sync thread (one per request under ASGI), so record there
+        recording = record_queries()
+        recorder = await sync_to_async(recording.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recording.__exit__)(None, None, None)
+        self._sampled(request, response, started, recorder)
+        return response
+
+    def _sampled(self, request, response, started, recorder):
+        duration_ms = (time.perf_counter() - started) * 1000
+        view = _view_name(request)
+        metrics_registry.observe_request(view, duration_ms)
+        metrics_registry.observe_queries(view, recorder)
+
+        n_plus_one = recorder.n_plus_one()
+        logger.log(logging.WARNING if n_plus_one else logging.INFO, json.dumps({
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 3),
+            'queries': recorder.count,
+            'db_ms': round(recorder.time_ms, 3),
+            'duplicate_queries': recorder.duplicates(),
+            'n_plus_one': [{'sql': shape[:300], 'count': count} for shape, count in n_plus_one],
+        }))
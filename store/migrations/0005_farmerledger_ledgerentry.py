@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:54
+
+from decimal import ROUND_HALF_UP, Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_unpaid_earnings(apps, schema_editor):
+    # Delivered items that are not paid out yet become unsettled ledger entries
+    OrderItem = apps.get_model('store', 'OrderItem')
+    FarmerLedger = apps.get_model('store', 'FarmerLedger')
+    LedgerEntry = apps.get_model('store', 'LedgerEntry')
+
+    ledgers = {}
+    entries = []
+    items = OrderItem.objects.filter(order__is_delivered=True, is_paid_out=False).select_related('product')
+    for item in items.iterator(chunk_size=2000):
+        ledger = ledgers.get(item.product.farmer_id)
+        if ledger is None:
+            ledger = ledgers[item.product.farmer_id] = FarmerLedger.objects.create(farmer_id=item.product.farmer_id)
+        gross = item.price * item.quantity
+        commission = (gross * Decimal('0.15')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        entries.append(LedgerEntry(ledger=ledger, order_item=item, gross=gross, commission=commission, net=gross - commission))
+        ledger.unpaid_gross += gross
+        ledger.unpaid_commission += commission
+        ledger.unpaid_net += gross - commission
+        ledger.unpaid_items += 1
+
+    LedgerEntry.objects.bulk_create(entries, batch_size=2000)
+    for ledger in ledgers.values():
+        ledger.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_farmer_payout_status_orderitem_is_paid_out'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FarmerLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unpaid_gross', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('unpaid_commission', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('unpaid_net', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('unpaid_items', models.PositiveIntegerField(default=0)),
+                ('total_paid_out', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('farmer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to='store.farmer')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('earning', 'Earning'), ('payout', 'Payout')], default='earning', max_length=10)),
+                ('gross', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('commission', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('net', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('ledger', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='store.farmerledger')),
+                ('order_item', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entry', to='store.orderitem')),
+                ('settlement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='settled_entries', to='store.ledgerentry')),
+            ],
+        ),
+        migrations.RunPython(backfill_unpaid_earnings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_farmer_orders_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(condition=models.Q(('entry_type', 'earning'), ('settlement__isnull', True)), fields=['ledger', 'id'], name='ledgerentry_unsettled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['consumer', '-order_date'], name='order_consumer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('is_delivered', False)), fields=['order_date'], name='order_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(condition=models.Q(('is_paid_out', False)), fields=['product', 'order'], name='orderitem_unpaid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_approved', True), ('price__gt', 0), ('stock__gt', 0)), fields=['category', 'price', 'id'], name='product_listable_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['farmer', 'name'], name='product_farmer_name_idx'),
+        ),
+    ]
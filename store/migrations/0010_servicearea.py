@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:09
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_orderevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceArea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pincode_prefix', models.CharField(max_length=6, validators=[django.core.validators.RegexValidator('^\\d{1,6}$', 'Enter 1 to 6 digits of a pincode.')])),
+                ('is_active', models.BooleanField(default=True)),
+                ('farmer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='service_areas', to='store.farmer')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('farmer', 'pincode_prefix'), name='servicearea_unique_prefix')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:13
+
+from django.db import migrations, models
+
+
+def backfill_fulfilled_items(apps, schema_editor):
+    # Items of orders that are already delivered count as fulfilled
+    OrderItem = apps.get_model('store', 'OrderItem')
+    OrderItem.objects.filter(order__is_delivered=True).update(is_fulfilled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_servicearea'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='fulfilled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='is_fulfilled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(backfill_fulfilled_items, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderevent',
+            name='event_type',
+            field=models.CharField(choices=[('order_placed', 'Order placed'), ('items_fulfilled', 'Items fulfilled'), ('order_delivered', 'Order delivered')], max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(condition=models.Q(('is_fulfilled', False)), fields=['product', 'order'], name='orderitem_unfulfilled_idx'),
+        ),
+    ]
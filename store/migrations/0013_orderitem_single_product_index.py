@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='orderitem',
+            name='orderitem_unpaid_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='orderitem',
+            name='orderitem_unfulfilled_idx',
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='store.product'),
+        ),
+    ]
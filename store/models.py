@@ -1,6 +1,7 @@
 # store/models.py
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.validators import RegexValidator
 
 # Model to extend the built-in User for Consumers
 class Consumer(models.Model):
@@ -65,6 +66,22 @@ class Product(models.Model):
     is_approved = models.BooleanField(default=False)
     # ---------------------
 
+    # Part of the cache key of the rendered product cards (see store/cards.py).
+    # .update() / bulk_update() don't touch it, so those callers set it themselves.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Consumer catalog + catalog API: only listable rows, in keyset order
+            models.Index(
+                fields=['category', 'price', 'id'],
+                name='product_listable_idx',
+                condition=models.Q(is_approved=True, stock__gt=0, price__gt=0),
+            ),
+            # Farmer inventory page, sorted by name
+            models.Index(fields=['farmer', 'name'], name='product_farmer_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -85,16 +102,172 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=50, default='Cash On Delivery')
     is_delivered = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Farmer order pages are sorted / paged on (order_date, id)
+            models.Index(fields=['order_date', 'id'], name='order_date_id_idx'),
+            # A consumer's orders, newest first
+            models.Index(fields=['consumer', '-order_date'], name='order_consumer_date_idx'),
+            # Pending deliveries
+            models.Index(fields=['order_date'], name='order_pending_idx', condition=models.Q(is_delivered=False)),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.consumer.user.username}"
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_index=False)  # see Meta.indexes
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2) # Price at the time of order
     is_paid_out = models.BooleanField(default=False)
+    # Each farmer fulfils their own items; the Order is delivered once all items are
+    is_fulfilled = models.BooleanField(default=False)
+    fulfilled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # product__farmer lookups join through product, then to the order. The
+            # only index on product: it serves the FK too, and every extra index
+            # is written on every checkout
+            models.Index(fields=['product', 'order'], name='orderitem_product_order_idx'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
 # Create your models here.
+
+# --- Service areas (which pincodes we deliver to, see store/service.py) ---
+
+class ServiceArea(models.Model):
+    # A full pincode or a prefix ("3800" covers 380001-380099).
+    # Without a farmer the area is platform-wide, like settings.ALLOWED_PINCODES.
+    farmer = models.ForeignKey(Farmer, related_name='service_areas', on_delete=models.CASCADE, null=True, blank=True)
+    pincode_prefix = models.CharField(
+        max_length=6,
+        validators=[RegexValidator(r'^\d{1,6}$', 'Enter 1 to 6 digits of a pincode.')],
+    )
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['farmer', 'pincode_prefix'], name='servicearea_unique_prefix'),
+        ]
+
+    def __str__(self):
+        return f"{self.pincode_prefix}* ({self.farmer or 'all farmers'})"
+
+# --- Cart (replaces request.session['cart']) ---
+# One row per cart line, so a quantity change is a single-row upsert
+# instead of rewriting the consumer's whole session.
+class Cart(models.Model):
+    consumer = models.OneToOneField(Consumer, related_name='cart', on_delete=models.CASCADE)
+    version = models.PositiveIntegerField(default=0)  # Bumped on every change
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Cart of {self.consumer}"
+
+class CartLine(models.Model):
+    cart = models.ForeignKey(Cart, related_name='lines', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='cartline_unique_product'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id}"
+
+# --- Farmer Ledger (payouts) ---
+# Earnings are recorded once, when an order is delivered, and the ledger keeps
+# the running unpaid totals so the payment pages only need to read one row.
+class FarmerLedger(models.Model):
+    farmer = models.OneToOneField(Farmer, related_name='ledger', on_delete=models.CASCADE)
+    unpaid_gross = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    unpaid_commission = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    unpaid_net = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    unpaid_items = models.PositiveIntegerField(default=0)
+    total_paid_out = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Ledger of {self.farmer}"
+
+class LedgerEntry(models.Model):
+    ENTRY_TYPE_CHOICES = [
+        ('earning', 'Earning'),
+        ('payout', 'Payout'),
+    ]
+    ledger = models.ForeignKey(FarmerLedger, related_name='entries', on_delete=models.CASCADE)
+    entry_type = models.CharField(max_length=10, choices=ENTRY_TYPE_CHOICES, default='earning')
+    # Set for earnings only; one entry per delivered order item
+    order_item = models.OneToOneField(OrderItem, related_name='ledger_entry', on_delete=models.SET_NULL, null=True, blank=True)
+    gross = models.DecimalField(max_digits=12, decimal_places=2)
+    commission = models.DecimalField(max_digits=12, decimal_places=2)
+    net = models.DecimalField(max_digits=12, decimal_places=2)
+    # Earnings point at the payout entry that settled them
+    settlement = models.ForeignKey('self', related_name='settled_entries', on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Unsettled earnings of a ledger (payments page + settlement)
+            models.Index(
+                fields=['ledger', 'id'],
+                name='ledgerentry_unsettled_idx',
+                condition=models.Q(entry_type='earning', settlement__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_entry_type_display()} of ₹{self.net} for {self.ledger.farmer}"
+
+# --- Order events (outbox) ---
+# Written in the same transaction as the order change, processed later by
+# `manage.py process_order_events` (see store/events.py)
+
+class OrderEvent(models.Model):
+    EVENT_TYPE_CHOICES = [
+        ('order_placed', 'Order placed'),
+        ('items_fulfilled', 'Items fulfilled'),  # one farmer's items of the order
+        ('order_delivered', 'Order delivered'),  # every item of the order
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPE_CHOICES)
+    order = models.ForeignKey(Order, related_name='events', on_delete=models.CASCADE)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField()  # not retried before this time
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The worker's queue: events still to run, oldest first
+            models.Index(
+                fields=['available_at', 'id'],
+                name='orderevent_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+            # Claims left behind by a worker that died
+            models.Index(
+                fields=['claimed_at'],
+                name='orderevent_processing_idx',
+                condition=models.Q(status='processing'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_event_type_display()} for Order {self.order_id} ({self.status})"
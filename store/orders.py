@@ -0,0 +1,88 @@
+# store/orders.py
+# Farmer order browsing.
+# The orders page is keyset paginated on (order_date, id), newest first, so a
+# page costs the same whether it is the first one or five years back.
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import OrderItem
+
+ORDERS_PAGE_SIZE = 50
+
+
+def _parse_date(value):
+    # parse_date() raises on well-formed but impossible dates (2020-13-45)
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def farmer_order_items(farmer, params):
+    """
+    A farmer's order items with the order and product joined in, filtered by the
+    optional `status` (delivered/pending), `start`/`end` dates and `product` id.
+    Filters that do not parse are ignored.
+    """
+    items = OrderItem.objects.filter(product__farmer=farmer).select_related('order', 'product').only(
+        'quantity', 'price', 'is_paid_out', 'is_fulfilled',
+        'order__id', 'order__order_date', 'order__full_name', 'order__pincode',
+        'product__name', 'product__unit',
+    )
+
+    status = params.get('status')
+    # The farmer's own items, whatever the other farmers in the order did
+    if status == 'delivered':
+        items = items.filter(is_fulfilled=True)
+    elif status == 'pending':
+        items = items.filter(is_fulfilled=False)
+
+    start = _parse_date(params.get('start'))
+    if start:
+        items = items.filter(order__order_date__date__gte=start)
+    end = _parse_date(params.get('end'))
+    if end:
+        items = items.filter(order__order_date__date__lte=end)
+
+    product = params.get('product')
+    if product and product.isdigit():
+        items = items.filter(product_id=int(product))
+
+    return items
+
+
+def _encode_cursor(item):
+    raw = json.dumps([item.order.order_date.isoformat(), item.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        order_date, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        order_date = parse_datetime(order_date)
+        if order_date is None:
+            return None
+        return order_date, int(item_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def farmer_orders_page(farmer, params, page_size=ORDERS_PAGE_SIZE):
+    """Return (items, next_cursor) for one page of the farmer's orders, newest first."""
+    items = farmer_order_items(farmer, params)
+
+    cursor = _decode_cursor(params.get('cursor') or '')
+    if cursor:
+        order_date, item_id = cursor
+        items = items.filter(
+            Q(order__order_date__lt=order_date)
+            | Q(order__order_date=order_date, id__lt=item_id)
+        )
+
+    # One extra row tells us if there is an older page
+    page = list(items.order_by('-order__order_date', '-id')[:page_size + 1])
+    next_cursor = _encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+    return page[:page_size], next_cursor
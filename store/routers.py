@@ -0,0 +1,49 @@
+# store/routers.py
+# Read replicas (settings.DATABASE_REPLICAS, see DATABASE_PROFILE in settings.py).
+# Nothing goes to a replica unless asked for: replicas lag behind the primary,
+# so checkout, payouts, the farmer pages and everything that fills a cache
+# (catalog, dashboard metrics) read from the primary. Only reads that can be
+# a moment out of date ask for a replica:
+#   with replica_reads(): ...           # queries run inside the block
+#   queryset.using(replica_alias())     # querysets evaluated later (streamed exports)
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_alias():
+    """A random replica's alias, or the primary's when there are none."""
+    replicas = settings.DATABASE_REPLICAS
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReadReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        # Inside a transaction, read what the transaction wrote
+        if _replica_reads.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return replica_alias()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replicas hold the same rows
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,240 @@
+# store/search.py
+# Server-side product search for the consumer home page.
+# An in-memory inverted index (prefixes + trigrams) over the listable products.
+# It is built once per process from one query and then kept up to date
+# product by product from the Product signals (see store/signals.py).
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.core.paginator import Paginator
+
+from .catalog import CATALOG_FIELDS, get_catalog_version, listable_products
+from .models import Product
+from .taxonomy import PRODUCT_TYPES
+
+SEARCH_PAGE_SIZE = 24
+INDEX_MAX_AGE = 60 * 15  # Rebuild at least this often (seconds)
+MAX_PREFIX_LENGTH = 20
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+# How much a match in each field is worth
+NAME_WEIGHT = 3
+ALIAS_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def trigrams(token):
+    padded = f' {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _build_alias_table():
+    # "Wheat (gehu)" -> a product called "Wheat" also matches "gehu" and vice versa
+    aliases = {}
+    for product_type in PRODUCT_TYPES.values():
+        if product_type.aliases:
+            base, alias = product_type.aliases
+            aliases.setdefault(base, set()).update(tokenize(alias))
+            aliases.setdefault(product_type.name.lower(), set()).update(tokenize(base))
+    return aliases
+
+
+NAME_ALIASES = _build_alias_table()
+
+# Category key -> words a consumer might search for
+CATEGORY_TERMS = {key: set(tokenize(key)) | set(tokenize(label)) for key, label in Product.CATEGORY_CHOICES}
+
+
+def document_terms(name, description, category):
+    """Return {token: weight} for one product."""
+    terms = {}
+
+    def add(tokens, weight):
+        for token in tokens:
+            if terms.get(token, 0) < weight:
+                terms[token] = weight
+
+    add(tokenize(description), DESCRIPTION_WEIGHT)
+    add(CATEGORY_TERMS.get(category, ()), ALIAS_WEIGHT)
+    add(NAME_ALIASES.get((name or '').lower(), ()), ALIAS_WEIGHT)
+    add(tokenize(name), NAME_WEIGHT)
+    return terms
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+        self.version = None
+        self.built_at = 0
+
+    def _clear(self):
+        self.documents = {}  # product id -> card row
+        self.terms = {}  # product id -> {token: weight}
+        self.prefixes = defaultdict(set)  # prefix -> product ids
+        self.trigram_postings = defaultdict(set)  # trigram -> product ids
+
+    # --- Building / incremental updates ---
+
+    def rebuild(self):
+        with self._lock:
+            # Version first: a change made while the rows are read leaves the index stale, not wrong
+            version = get_catalog_version()
+            rows = listable_products().order_by('category', 'price', 'id').values(*CATALOG_FIELDS, 'description')
+            self._clear()
+            for row in rows:
+                self._add(row)
+            self.version = version
+            self.built_at = time.monotonic()
+
+    def _add(self, row):
+        description = row.pop('description', None)
+        terms = document_terms(row['name'], description, row['category'])
+        product_id = row['id']
+        self.documents[product_id] = row
+        self.terms[product_id] = terms
+        for token in terms:
+            for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                self.prefixes[token[:length]].add(product_id)
+            for gram in trigrams(token):
+                self.trigram_postings[gram].add(product_id)
+
+    def _remove(self, product_id):
+        terms = self.terms.pop(product_id, None)
+        self.documents.pop(product_id, None)
+        if not terms:
+            return
+        for token in terms:
+            for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                postings = self.prefixes.get(token[:length])
+                if postings is not None:
+                    postings.discard(product_id)
+                    if not postings:
+                        del self.prefixes[token[:length]]
+            for gram in trigrams(token):
+                postings = self.trigram_postings.get(gram)
+                if postings is not None:
+                    postings.discard(product_id)
+                    if not postings:
+                        del self.trigram_postings[gram]
+
+    def update_product(self, product):
+        """Re-index one product after it was saved."""
+        self.update_products([product])
+
+    def update_products(self, products):
+        """Re-index products changed by one catalog version bump (e.g. a checkout)."""
+        with self._lock:
+            if self.version is None:
+                return  # Not built yet, the first search will build it
+            for product in products:
+                self._remove(product.id)
+                # Views assign raw POST strings before save(), so normalise the numbers
+                price = Decimal(str(product.price))
+                stock = int(product.stock)
+                if product.is_approved and stock > 0 and price > 0:
+                    row = {field: getattr(product, field) for field in CATALOG_FIELDS}
+                    row['price'] = price
+                    row['description'] = product.description
+                    self._add(row)
+            self._mark_synced()
+
+    def remove_product(self, product_id):
+        with self._lock:
+            if self.version is None:
+                return
+            self._remove(product_id)
+            self._mark_synced()
+
+    def _mark_synced(self):
+        # Called right after our own invalidate_catalog() bumped the version by one.
+        # If the index was already behind (someone else changed the catalog),
+        # leave it stale so the next search rebuilds it.
+        current = get_catalog_version()
+        if self.version in (current, current - 1):
+            self.version = current
+
+    def _is_stale(self):
+        return (
+            self.version is None
+            or self.version != get_catalog_version()
+            or time.monotonic() - self.built_at > INDEX_MAX_AGE
+        )
+
+    def ensure_fresh(self):
+        # Another process (or a bulk .update()) changed the catalog -> full rebuild.
+        # Concurrent requests wait for one rebuild instead of each running their own.
+        if self._is_stale():
+            with self._lock:
+                if self._is_stale():
+                    self.rebuild()
+
+    # --- Querying ---
+
+    def _score(self, query_token, terms):
+        if query_token in terms:
+            return terms[query_token] * 3
+        best = 0
+        query_grams = trigrams(query_token) if len(query_token) >= 3 else None
+        for token, weight in terms.items():
+            if token.startswith(query_token):
+                best = max(best, weight * 2)
+            elif query_grams:
+                token_grams = trigrams(token)
+                similarity = len(query_grams & token_grams) / len(query_grams | token_grams)
+                if similarity >= MIN_TRIGRAM_SIMILARITY:
+                    best = max(best, weight * similarity)
+        return best
+
+    def search(self, query):
+        """Return the matching card rows, best match first."""
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+        self.ensure_fresh()
+
+        with self._lock:
+            scores = defaultdict(float)
+            for query_token in query_tokens:
+                candidates = set(self.prefixes.get(query_token[:MAX_PREFIX_LENGTH], ()))
+                if len(query_token) >= 3:
+                    # Only products sharing enough trigrams can pass the similarity cut
+                    query_grams = trigrams(query_token)
+                    shared = Counter()
+                    for gram in query_grams:
+                        shared.update(self.trigram_postings.get(gram, ()))
+                    needed = MIN_TRIGRAM_SIMILARITY * len(query_grams)
+                    candidates.update(product_id for product_id, count in shared.items() if count >= needed)
+                for product_id in candidates:
+                    score = self._score(query_token, self.terms[product_id])
+                    if score:
+                        scores[product_id] += score
+
+            results = [self.documents[product_id] for product_id in scores]
+
+        results.sort(key=lambda row: (-scores[row['id']], row['name'].lower(), row['id']))
+        return results
+
+
+search_index = ProductSearchIndex()
+
+
+def search_products(query, page_number=1, per_page=SEARCH_PAGE_SIZE, farmer_ids=None):
+    """
+    Search the listable products and return one page of ranked results.
+    `farmer_ids` (a set) keeps only products of those farmers.
+    """
+    results = search_index.search(query)
+    if farmer_ids is not None:
+        results = [row for row in results if row['farmer_id'] in farmer_ids]
+    paginator = Paginator(results, per_page)
+    return paginator.get_page(page_number)
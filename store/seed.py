@@ -0,0 +1,177 @@
+# store/seed.py
+# Synthetic marketplace data for load tests and benchmarks.
+# Farmers, consumers, products and historical orders are written with
+# bulk_create (a few queries per table, not per row), so tens of thousands of
+# rows take seconds. The same `seed` always gives the same data. Every seeded
+# user name starts with SEED_PREFIX, so a seeded marketplace can be removed again.
+import random
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import invalidate_catalog
+from .dashboard import invalidate_farmer_metrics
+from .ledger import split_amount
+from .models import Consumer, Farmer, FarmerLedger, LedgerEntry, Order, OrderItem, Product
+from .search import search_index
+from .service import invalidate_service_areas
+from .taxonomy import PRODUCT_TYPES
+
+SEED_PREFIX = 'seed-'
+SEED_PASSWORD = 'seedpass123'
+HISTORY_DAYS = 90  # orders are spread over this many days
+DELIVERED_SHARE = 0.8  # of the historical orders
+BATCH_SIZE = 1000
+
+
+def seeded_users():
+    return User.objects.filter(username__startswith=SEED_PREFIX)
+
+
+def clear_seeded_marketplace():
+    """Delete every seeded user and everything that hangs off them."""
+    with transaction.atomic():
+        # Orders only lose their consumer (SET_NULL), so delete them explicitly
+        Order.objects.filter(consumer__user__username__startswith=SEED_PREFIX).delete()
+        seeded_users().delete()
+    _refresh_caches()
+
+
+def _refresh_caches():
+    # bulk_create / queryset.delete() skip the save signals
+    invalidate_catalog()
+    invalidate_service_areas()
+    invalidate_farmer_metrics(Farmer.objects.values_list('id', flat=True))
+    search_index.rebuild()
+
+
+def _create_users(kind, count, password):
+    User.objects.bulk_create(
+        [User(username=f'{SEED_PREFIX}{kind}{i}@example.com', email=f'{SEED_PREFIX}{kind}{i}@example.com',
+              first_name=kind.title(), last_name=str(i), password=password)
+         for i in range(count)],
+        batch_size=BATCH_SIZE,
+    )
+    # bulk_create only returns primary keys on some databases
+    return list(seeded_users().filter(username__startswith=f'{SEED_PREFIX}{kind}').order_by('id'))
+
+
+def seed_marketplace(farmers=50, products_per_farmer=20, consumers=200, orders=5000, items_per_order=3, seed=1):
+    """
+    Create a synthetic marketplace and return the number of rows created per model.
+    Raises ValueError if a seeded marketplace already exists.
+    """
+    if seeded_users().exists():
+        raise ValueError('A seeded marketplace already exists.')
+
+    rng = random.Random(seed)
+    password = make_password(SEED_PASSWORD)  # hashed once, shared by every seeded user
+    pincodes = list(settings.ALLOWED_PINCODES)
+    product_types = sorted(PRODUCT_TYPES.values())
+    now = timezone.now()
+
+    with transaction.atomic():
+        Farmer.objects.bulk_create(
+            [Farmer(user=user, kisan_id=f'SEED{user.id}', contact_no=f'9{i:09d}', pincode=rng.choice(pincodes),
+                    village_name=f'Village {i % 25}')
+             for i, user in enumerate(_create_users('farmer', farmers, password))],
+            batch_size=BATCH_SIZE,
+        )
+        farmer_rows = list(Farmer.objects.filter(user__username__startswith=SEED_PREFIX).order_by('id'))
+        Consumer.objects.bulk_create(
+            [Consumer(user=user, contact_no=f'8{i:09d}')
+             for i, user in enumerate(_create_users('consumer', consumers, password))],
+            batch_size=BATCH_SIZE,
+        )
+        consumer_rows = list(Consumer.objects.filter(user__username__startswith=SEED_PREFIX).order_by('id'))
+
+        Product.objects.bulk_create(
+            [Product(farmer=farmer, name=product_type.name, description=f'Fresh {product_type.name.lower()} from {farmer.village_name}',
+                     price=Decimal(rng.randint(10, 400)), unit=product_type.default_unit, stock=rng.randint(0, 500),
+                     image_path=product_type.image_path, category=product_type.category,
+                     # A few listings are still waiting for approval, as in the real store
+                     is_approved=rng.random() < 0.9)
+             for farmer in farmer_rows
+             for product_type in rng.sample(product_types, min(products_per_farmer, len(product_types)))],
+            batch_size=BATCH_SIZE,
+        )
+        product_rows = list(Product.objects.filter(farmer__in=farmer_rows).order_by('id'))
+
+        order_rows, order_lines = [], []
+        for i in range(orders):
+            consumer = rng.choice(consumer_rows)
+            lines = rng.sample(product_rows, min(rng.randint(1, items_per_order), len(product_rows)))
+            quantities = [rng.randint(1, 5) for _ in lines]
+            order_rows.append(Order(
+                consumer=consumer, total_amount=sum(p.price * q for p, q in zip(lines, quantities)),
+                full_name=f'Consumer {consumer.id}', mobile=consumer.contact_no, address=f'{i} Seed Street',
+                pincode=rng.choice(pincodes), is_delivered=rng.random() < DELIVERED_SHARE,
+            ))
+            order_lines.append(list(zip(lines, quantities)))
+        order_rows = Order.objects.bulk_create(order_rows, batch_size=BATCH_SIZE)
+        if order_rows and order_rows[0].pk is None:
+            order_rows = list(Order.objects.filter(consumer__in=consumer_rows).order_by('id'))
+
+        # order_date is auto_now_add, so spread the history out afterwards
+        for order in order_rows:
+            order.order_date = now - timedelta(days=rng.uniform(0, HISTORY_DAYS))
+        Order.objects.bulk_update(order_rows, ['order_date'], batch_size=BATCH_SIZE)
+
+        item_rows = OrderItem.objects.bulk_create(
+            [OrderItem(order=order, product=product, quantity=quantity, price=product.price,
+                       is_fulfilled=order.is_delivered,
+                       fulfilled_at=order.order_date + timedelta(days=1) if order.is_delivered else None)
+             for order, lines in zip(order_rows, order_lines)
+             for product, quantity in lines],
+            batch_size=BATCH_SIZE,
+        )
+        if item_rows and item_rows[0].pk is None:
+            item_rows = list(OrderItem.objects.filter(order__in=order_rows).select_related('product'))
+
+        entries = _seed_ledgers(item_rows)
+
+    _refresh_caches()
+    return {
+        'farmers': len(farmer_rows),
+        'consumers': len(consumer_rows),
+        'products': len(product_rows),
+        'orders': len(order_rows),
+        'order_items': len(item_rows),
+        'ledger_entries': entries,
+    }
+
+
+def _seed_ledgers(items):
+    # What record_delivery() would have written for the delivered orders, in bulk
+    by_farmer = defaultdict(list)
+    for item in items:
+        if item.is_fulfilled:
+            gross = item.price * item.quantity
+            commission, net = split_amount(gross)
+            by_farmer[item.product.farmer_id].append(
+                LedgerEntry(order_item=item, gross=gross, commission=commission, net=net)
+            )
+
+    FarmerLedger.objects.bulk_create([
+        FarmerLedger(
+            farmer_id=farmer_id,
+            unpaid_gross=sum(entry.gross for entry in entries),
+            unpaid_commission=sum(entry.commission for entry in entries),
+            unpaid_net=sum(entry.net for entry in entries),
+            unpaid_items=len(entries),
+        )
+        for farmer_id, entries in by_farmer.items()
+    ])
+    ledger_ids = dict(FarmerLedger.objects.filter(farmer_id__in=by_farmer).values_list('farmer_id', 'id'))
+    entries = [entry for farmer_id, farmer_entries in by_farmer.items() for entry in farmer_entries]
+    for farmer_id, farmer_entries in by_farmer.items():
+        for entry in farmer_entries:
+            entry.ledger_id = ledger_ids[farmer_id]
+    LedgerEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+    return len(entries)
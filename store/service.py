@@ -0,0 +1,112 @@
+# store/service.py
+# Pincode serviceability.
+# Delivery areas are pincode prefixes: settings.ALLOWED_PINCODES and platform-wide
+# ServiceArea rows say where we deliver at all. A farmer with ServiceArea rows
+# serves their own pincode plus those areas; a farmer without any serves every
+# platform area, as all farmers did before ServiceAreas existed. All of it is
+# loaded into an in-memory prefix index, so a lookup is at most 6 dict/set
+# probes and never a query. Saving a ServiceArea or a Farmer bumps a version in
+# the shared cache (settings.CACHES) and every process reloads its index on its
+# next lookup (see store/signals.py).
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Farmer, ServiceArea
+
+SERVICE_VERSION_KEY = 'store:service_areas:version'
+PINCODE_RE = re.compile(r'^\d{6}$')
+
+
+def normalize_pincode(pincode):
+    """Return the pincode as 6 digits, or None if it isn't one."""
+    pincode = re.sub(r'\s+', '', str(pincode or ''))
+    return pincode if PINCODE_RE.match(pincode) else None
+
+
+def _new_version():
+    return int(time.time() * 1000)
+
+
+def get_service_version():
+    version = cache.get(SERVICE_VERSION_KEY)
+    if version is None:
+        cache.add(SERVICE_VERSION_KEY, _new_version(), timeout=None)
+        version = cache.get(SERVICE_VERSION_KEY)
+    return version
+
+
+def invalidate_service_areas():
+    try:
+        cache.incr(SERVICE_VERSION_KEY)
+    except ValueError:
+        cache.set(SERVICE_VERSION_KEY, _new_version(), timeout=None)
+
+
+class ServiceIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.platform_prefixes = frozenset()
+        self.farmer_prefixes = {}  # prefix -> frozenset of farmer ids
+        self.platform_farmers = frozenset()  # farmers without areas of their own
+        self._serving = {}  # pincode -> frozenset of farmer ids (memo, per version)
+
+    def rebuild(self):
+        version = get_service_version()
+        platform = set(settings.ALLOWED_PINCODES)
+        by_prefix = defaultdict(set)
+
+        farmers = dict(Farmer.objects.values_list('id', 'pincode'))
+        for farmer_id, prefix in ServiceArea.objects.filter(is_active=True).values_list('farmer_id', 'pincode_prefix'):
+            if farmer_id is None:
+                platform.add(prefix)
+            else:
+                by_prefix[prefix].add(farmer_id)
+        with_areas = set().union(*by_prefix.values())
+        for farmer_id in with_areas:
+            pincode = normalize_pincode(farmers.get(farmer_id))
+            if pincode:
+                by_prefix[pincode].add(farmer_id)
+
+        with self._lock:
+            self.platform_prefixes = frozenset(platform)
+            self.farmer_prefixes = {prefix: frozenset(ids) for prefix, ids in by_prefix.items()}
+            self.platform_farmers = frozenset(farmers.keys() - with_areas)
+            self._serving = {}
+            self.version = version
+
+    def ensure_fresh(self):
+        if self.version != get_service_version():
+            self.rebuild()
+
+    def is_serviceable(self, pincode):
+        """True if the platform delivers to this pincode at all."""
+        pincode = normalize_pincode(pincode)
+        if not pincode:
+            return False
+        self.ensure_fresh()
+        return any(pincode[:length] in self.platform_prefixes for length in range(1, 7))
+
+    def farmers_serving(self, pincode):
+        """Frozenset of the ids of farmers who deliver to this pincode."""
+        if not self.is_serviceable(pincode):
+            return frozenset()
+        pincode = normalize_pincode(pincode)
+        # Local references, so a concurrent rebuild can't mix two versions
+        farmer_prefixes, platform_farmers, memo = self.farmer_prefixes, self.platform_farmers, self._serving
+        serving = memo.get(pincode)
+        if serving is None:
+            serving = platform_farmers.union(*(farmer_prefixes.get(pincode[:length], ()) for length in range(1, 7)))
+            memo[pincode] = serving
+        return serving
+
+    def serves(self, farmer_id, pincode):
+        return farmer_id in self.farmers_serving(pincode)
+
+
+service_index = ServiceIndex()
@@ -0,0 +1,53 @@
+# store/signals.py
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cart import merge_session_cart
+from .catalog import invalidate_catalog
+from .dashboard import invalidate_farmer_metrics
+from .models import Farmer, Product, ServiceArea
+from .search import search_index
+from .service import invalidate_service_areas
+
+
+# --- Catalog cache, search index and farmer metrics invalidation ---
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    invalidate_catalog()
+    search_index.update_product(instance)
+    invalidate_farmer_metrics([instance.farmer_id])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    invalidate_catalog()
+    search_index.remove_product(instance.id)
+    invalidate_farmer_metrics([instance.farmer_id])
+
+
+# --- Carts kept in the session move to the Cart table on login ---
+@receiver(user_logged_in)
+def move_session_cart(sender, request, user, **kwargs):
+    if request is not None and hasattr(user, 'consumer'):
+        merge_session_cart(request, user.consumer)
+
+
+# --- Pincode service index reload (see store/service.py) ---
+@receiver(post_save, sender=ServiceArea)
+@receiver(post_delete, sender=ServiceArea)
+@receiver(post_save, sender=Farmer)
+@receiver(post_delete, sender=Farmer)
+def service_areas_changed(sender, **kwargs):
+    invalidate_service_areas()
+
+
+# --- SQLite tuning (DATABASE_PROFILE=sqlite, see settings.py) ---
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite' and settings.SQLITE_PRAGMAS:
+        with connection.cursor() as cursor:
+            for pragma, value in settings.SQLITE_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {pragma} = {value}')
@@ -0,0 +1,162 @@
+# store/taxonomy.py
+# Product taxonomy registry.
+# Everything we know about the products a farmer can list (category, image,
+# default unit, search aliases) is built ONCE at import time into read-only
+# hash maps, so views, admin and search never scan lists to classify a name.
+import re
+from collections import namedtuple
+from types import MappingProxyType
+
+# This is the logic to auto-assign images
+PRODUCT_IMAGE_MAP = {
+    # Vegetables
+    "Tomatoes": "Products/vegetables/tomatoes.jpg",
+    "Onions": "Products/vegetables/onions.jpg",
+    "Potatoes": "Products/vegetables/potatoes.jpg",
+    "Cabbage": "Products/vegetables/cabbage.jpg",
+    "Spinach": "Products/vegetables/spinach.jpg",
+    "Carrots": "Products/vegetables/carrots.jpg",
+    "Capsicum": "Products/vegetables/capsicum.jpg",
+    "Cauliflower": "Products/vegetables/cauliflower.jpg",
+    "Broccoli": "Products/vegetables/broccoli.jpg",
+    "Cucumber": "Products/vegetables/cucumber.jpg",
+    "Brinjal": "Products/vegetables/brinjal.jpg",
+    "Garlic": "Products/vegetables/garlic.jpg",
+    "Ginger": "Products/vegetables/ginger.jpg",
+    "Green Chilli": "Products/vegetables/green_chilli.jpg",
+    "Lemon": "Products/vegetables/lemon.jpg",
+    # Fruits
+    "Bananas": "Products/fruits/bananas.jpg",
+    "Apples": "Products/fruits/apples.jpg",
+    "Grapes": "Products/fruits/grapes.jpg",
+    "Mangoes": "Products/fruits/mangoes.jpg",
+    "Oranges": "Products/fruits/oranges.jpg",
+    "Pineapple": "Products/fruits/pineapple.jpg",
+    "Pomegranate": "Products/fruits/pomegranate.jpg",
+    "Kiwi": "Products/fruits/kiwi.jpg",
+    "Papaya": "Products/fruits/papaya.jpg",
+    "Watermelon": "Products/fruits/watermelon.jpg",
+    "Coconut": "Products/fruits/coconut.jpg",
+    "Muskmelon": "Products/fruits/muskmelon.jpg",
+    "Strawberry": "Products/fruits/strawberry.jpg",
+    "Litchi": "Products/fruits/litchi.jpg",
+    "Cherries": "Products/fruits/cherries.jpg",
+    # Grains & Pulses
+    "Wheat (gehu)": "Products/grains/wheat.jpg",
+    "Basmati rice": "Products/grains/rice.jpg",
+    "Toor dal (arhar)": "Products/grains/arhar.jpg",
+    "Moong dal (yellow)": "Products/grains/moong (yellow).jpg",
+    "Urad dal (split)": "Products/grains/split.jpg",
+    "Chana dal": "Products/grains/chana dal.jpg",
+    "Kidney beans (rajma)": "Products/grains/kidneybeans.jpg",
+    "Chickpeas (chhole)": "Products/grains/chickpeas.jpg",
+    "Oats": "Products/grains/oats.jpg",
+    "Barley": "Products/grains/barley.jpg",
+    "Rye": "Products/grains/rye.jpg",
+    "Teff": "Products/grains/teff.jpg",
+    "Sorghum (jowar)": "Products/grains/sorghum.jpg",
+    "Millet (bajra)": "Products/grains/millet.jpg",
+    "Buckwheat": "Products/grains/buckwheat.jpg",
+    # Dairy
+    "Milk": "Products/dairy/milk.jpg",
+    "Paneer": "Products/dairy/paneer.jpg",
+    "Ghee": "Products/dairy/ghee.jpg",
+    "Curd": "Products/dairy/curd.jpg",
+    "Butter": "Products/dairy/butter.jpg",
+    "Cheese Slice": "Products/dairy/cheese slice.jpg",
+    "Fresh Cream": "Products/dairy/cream.jpg",
+    "Lassi": "Products/dairy/lassi.jpg",
+    "Chaas (Buttermilk)": "Products/dairy/buttermilk.jpg",
+    "Bread": "Products/dairy/bread.jpg",
+    "Cheese Spread": "Products/dairy/cheese spread.jpg",
+    "Diced Cheese": "Products/dairy/diced cheese.jpg",
+    "Condensed Milk": "Products/dairy/condensed milk.jpg",
+    "Ice Cream": "Products/dairy/ice cream.jpg",
+    "Flavored Milk (Pack of 5)": "Products/dairy/flavoured milk.jpg",
+}
+
+DEFAULT_IMAGE = 'Images/logo.png'
+DEFAULT_CATEGORY = 'vegetables'
+DEFAULT_UNIT = 'kg'
+
+# Which category each product belongs to (same order as on the add-products page)
+CATEGORY_PRODUCTS = {
+    'vegetables': (
+        "Tomatoes", "Onions", "Potatoes", "Cabbage", "Spinach", "Carrots", "Capsicum", "Cauliflower",
+        "Broccoli", "Cucumber", "Brinjal", "Garlic", "Ginger", "Green Chilli", "Lemon",
+    ),
+    'fruits': (
+        "Bananas", "Apples", "Grapes", "Mangoes", "Oranges", "Pineapple", "Pomegranate", "Kiwi",
+        "Papaya", "Watermelon", "Coconut", "Muskmelon", "Strawberry", "Litchi", "Cherries",
+    ),
+    'grains': (
+        "Wheat (gehu)", "Basmati rice", "Toor dal (arhar)", "Moong dal (yellow)", "Urad dal (split)",
+        "Chana dal", "Kidney beans (rajma)", "Chickpeas (chhole)", "Oats", "Barley", "Rye", "Teff",
+        "Sorghum (jowar)", "Millet (bajra)", "Buckwheat",
+    ),
+    'dairy': (
+        "Milk", "Paneer", "Ghee", "Curd", "Butter", "Cheese Slice", "Fresh Cream", "Lassi",
+        "Chaas (Buttermilk)", "Bread", "Cheese Spread", "Diced Cheese", "Condensed Milk", "Ice Cream",
+        "Flavored Milk (Pack of 5)",
+    ),
+}
+
+# Products not usually sold by the kg
+DEFAULT_UNITS = {
+    "Spinach": 'bunch',
+    "Bananas": 'dozen',
+    "Coconut": 'piece',
+    "Pineapple": 'piece',
+    "Watermelon": 'piece',
+    "Muskmelon": 'piece',
+    "Milk": 'litre',
+    "Lassi": 'litre',
+    "Chaas (Buttermilk)": 'litre',
+    "Bread": 'piece',
+    "Cheese Slice": 'piece',
+    "Cheese Spread": 'piece',
+    "Condensed Milk": 'piece',
+    "Ice Cream": 'piece',
+    "Flavored Milk (Pack of 5)": 'piece',
+}
+
+ProductType = namedtuple('ProductType', ['name', 'category', 'image_path', 'default_unit', 'aliases'])
+
+ALIAS_RE = re.compile(r'^(.*?)\s*\((.+)\)$')
+
+
+def _aliases(name):
+    # "Wheat (gehu)" -> ('wheat', 'gehu'): a consumer may search for either word
+    match = ALIAS_RE.match(name)
+    if not match:
+        return ()
+    return (match.group(1).lower(), match.group(2).lower())
+
+
+def _build_registry():
+    registry = {}
+    for category, names in CATEGORY_PRODUCTS.items():
+        for name in names:
+            registry[name] = ProductType(
+                name=name,
+                category=category,
+                image_path=PRODUCT_IMAGE_MAP.get(name, DEFAULT_IMAGE),
+                default_unit=DEFAULT_UNITS.get(name, DEFAULT_UNIT),
+                aliases=_aliases(name),
+            )
+    return registry
+
+
+PRODUCT_TYPES = MappingProxyType(_build_registry())
+PRODUCT_TYPES_BY_LOWER_NAME = MappingProxyType({name.lower(): product_type for name, product_type in PRODUCT_TYPES.items()})
+PRODUCT_TYPES_BY_CATEGORY = MappingProxyType({
+    category: tuple(PRODUCT_TYPES[name] for name in names) for category, names in CATEGORY_PRODUCTS.items()
+})
+
+
+def lookup(name):
+    """Return the ProductType for a product name (case-insensitive), or a default one."""
+    product_type = PRODUCT_TYPES.get(name) or PRODUCT_TYPES_BY_LOWER_NAME.get((name or '').lower())
+    if product_type is None:
+        product_type = ProductType(name, DEFAULT_CATEGORY, DEFAULT_IMAGE, DEFAULT_UNIT, _aliases(name or ''))
+    return product_type
@@ -0,0 +1,13 @@
+# store/templatetags/product_cards.py
+# {% product_cards products "partials/consumer_product_card.html" %}
+# Renders one card per product from the per-card fragment cache (see store/cards.py).
+from django import template
+
+from store.cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def product_cards(context, products, template_name):
+    return render_cards(template_name, products, csrf_token=context.get('csrf_token'))
@@ -0,0 +1,40 @@
+# store/templatetags/product_images.py
+# {% product_image product.image_path product.name %}
+# Renders a <picture> with WebP and JPEG srcsets from the thumbnail manifest
+# (see store/images.py), or a plain lazy-loaded <img> when there is none.
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from store.images import load_manifest
+from store.taxonomy import DEFAULT_IMAGE
+
+register = template.Library()
+
+# Cards are 200-300px wide: two per row on phones, fixed width on desktop
+DEFAULT_SIZES = '(max-width: 600px) 50vw, 300px'
+
+
+def _srcset(variants):
+    return ', '.join(f'{static(name)} {width}w' for width, name in variants)
+
+
+@register.simple_tag
+def product_image(image_path, alt='', sizes=DEFAULT_SIZES):
+    image_path = image_path or DEFAULT_IMAGE
+    entry = load_manifest().get(image_path)
+    if not entry:
+        return format_html('<img src="{}" alt="{}" loading="lazy" decoding="async">', static(image_path), alt)
+
+    variants = entry['variants']
+    jpeg = variants['jpeg']
+    # The 2nd-smallest JPEG is a sensible fallback for browsers without srcset
+    fallback = jpeg[min(1, len(jpeg) - 1)][1]
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((f'image/{fmt}', _srcset(variants[fmt]), sizes) for fmt in ('webp',) if variants.get(fmt)),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="lazy" decoding="async"></picture>',
+        sources, static(fallback), _srcset(jpeg), sizes, entry['width'], entry['height'], alt,
+    )
@@ -1,3 +1,823 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.template import Context, Template
+from django.template.loader import get_template
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from .benchmarks import compare_reports, run_benchmarks
+from .cart import CartProblem, get_cart, update_cart_lines
+from .cards import render_cards
+from .catalog import InvalidCatalogQuery, catalog_page, get_catalog, get_catalog_version, invalidate_catalog
+from .checkout import place_order
+from .dashboard import get_farmer_metrics
+from .delivery import plan_delivery_run, plan_route
+from .events import _handlers, process_events, subscribe
+from .fulfilment import fulfil_orders
+from .images import _manifest, load_manifest, write_manifest
+from .metrics import N_PLUS_ONE_MIN, metrics_registry, record_queries
+from .search import search_index, search_products
+from .seed import seed_marketplace
+from .service import service_index
+from .taxonomy import DEFAULT_IMAGE, lookup
+from .admin import approve_products
+from .ledger import record_delivery, settle_farmers, write_payout_report
+from .routers import ReadReplicaRouter, replica_reads
+from .models import Consumer, Farmer, FarmerLedger, Order, OrderEvent, OrderItem, Product, ServiceArea
+
+
+def make_farmer(username='farmer@example.com', kisan_id='KISAN1', pincode='380007'):
+    user = User.objects.create_user(username=username, password='pass1234')
+    return Farmer.objects.create(user=user, kisan_id=kisan_id, contact_no='9999999999',
+                                 pincode=pincode, village_name='Test Village')
+
+
+def make_consumer(username='consumer@example.com'):
+    user = User.objects.create_user(username=username, password='pass1234')
+    return Consumer.objects.create(user=user, contact_no='8888888888')
+
+
+SHIPPING = {
+    'full_name': 'Test Consumer',
+    'mobile': '8888888888',
+    'address': 'Test Address',
+    'pincode': '380007',
+    'payment_method': 'Cash On Delivery',
+}
+
+
+# --- Checkout under concurrency ---
+class ConcurrentCheckoutTests(TransactionTestCase):
+    CHECKOUTS = 200
+    STOCK = 50
+
+    def setUp(self):
+        farmer = make_farmer()
+        self.product = Product.objects.create(farmer=farmer, name='Tomatoes', price=20, stock=self.STOCK,
+                                              category='vegetables', is_approved=True)
+        self.consumers = [make_consumer(f'consumer{i}@example.com') for i in range(10)]
+
+    def _checkout(self, i):
+        try:
+            consumer = self.consumers[i % len(self.consumers)]
+            place_order(consumer, {str(self.product.id): 1 + i % 3}, SHIPPING)
+            return 'placed'
+        except CartProblem:
+            return 'out_of_stock'
+        except OperationalError:
+            return 'locked'
+        finally:
+            connection.close()
+
+    def test_stock_never_goes_negative(self):
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            outcomes = list(pool.map(self._checkout, range(self.CHECKOUTS)))
+
+        self.product.refresh_from_db()
+        sold = sum(OrderItem.objects.values_list('quantity', flat=True))
+
+        self.assertGreaterEqual(self.product.stock, 0)
+        self.assertEqual(self.product.stock + sold, self.STOCK)
+        self.assertEqual(Order.objects.count(), outcomes.count('placed'))
+        self.assertEqual(OrderItem.objects.count(), outcomes.count('placed'))
+        self.assertIn('out_of_stock', outcomes)
+
+    def test_failed_line_rolls_back_whole_order(self):
+        other = Product.objects.create(farmer=self.product.farmer, name='Onions', price=10, stock=1,
+                                       category='vegetables', is_approved=True)
+        cart = {str(self.product.id): 2, str(other.id): 5}
+
+        with self.assertRaises(CartProblem):
+            place_order(self.consumers[0], cart, SHIPPING)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, self.STOCK)
+        self.assertEqual(Order.objects.count(), 0)
+
+
+# --- Order event outbox ---
+class OrderEventTests(TestCase):
+
+    def setUp(self):
+        farmer = make_farmer()
+        self.product = Product.objects.create(farmer=farmer, name='Tomatoes', price=20, stock=10,
+                                              category='vegetables', is_approved=True)
+        self.order = place_order(make_consumer(), {str(self.product.id): 2}, SHIPPING)
+
+    def test_events_run_off_the_request_path(self):
+        self.assertEqual(list(OrderEvent.objects.values_list('event_type', 'status')), [('order_placed', 'pending')])
+
+        fulfil_orders(self.product.farmer, [self.order.id])
+        self.assertFalse(FarmerLedger.objects.exists())  # nothing ran in the request
+
+        self.assertEqual(process_events(workers=1), 3)  # placed, items_fulfilled, delivered
+        self.assertEqual(set(OrderEvent.objects.values_list('status', flat=True)), {'done'})
+        self.assertEqual(self.product.farmer.ledger.unpaid_items, 1)
+        self.assertEqual(process_events(workers=1), 0)
+
+    def test_failed_event_is_retried_later(self):
+        @subscribe('order_placed')
+        def broken(event):
+            raise RuntimeError('boom')
+        try:
+            with self.assertLogs('store.events', 'ERROR'):
+                self.assertEqual(process_events(workers=1), 1)
+        finally:
+            _handlers['order_placed'].remove(broken)
+
+        event = OrderEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+        self.assertIn('boom', event.last_error)
+        self.assertEqual(process_events(workers=1), 0)  # not due yet
+
+
+# --- Pincode serviceability ---
+class ServiceAreaTests(TestCase):
+
+    def setUp(self):
+        self.near = make_farmer()  # pincode 380007
+        self.far = make_farmer('far@example.com', kisan_id='KISAN2', pincode='380015')
+
+    def test_farmers_serving(self):
+        # Without areas of their own, farmers serve every platform area
+        self.assertEqual(service_index.farmers_serving('380007'), {self.near.id, self.far.id})
+        self.assertFalse(service_index.is_serviceable('110001'))
+        self.assertEqual(service_index.farmers_serving('110001'), set())
+
+        # Index reloads as soon as an area is added
+        ServiceArea.objects.create(farmer=self.far, pincode_prefix='380001')
+        self.assertEqual(service_index.farmers_serving('380007'), {self.near.id})
+        self.assertEqual(service_index.farmers_serving('380015'), {self.near.id, self.far.id})  # far's own pincode
+        self.assertEqual(service_index.farmers_serving('380001'), {self.near.id, self.far.id})
+        ServiceArea.objects.create(pincode_prefix='1100')
+        self.assertTrue(service_index.is_serviceable('110001'))
+        self.assertEqual(service_index.farmers_serving('110001'), {self.near.id})
+
+    def test_checkout_rejects_farmers_not_serving_the_pincode(self):
+        ServiceArea.objects.create(farmer=self.far, pincode_prefix='380015')
+        product = Product.objects.create(farmer=self.far, name='Apples', price=20, stock=5,
+                                         category='fruits', is_approved=True)
+        with self.assertRaises(CartProblem) as raised:
+            place_order(make_consumer(), {str(product.id): 1}, SHIPPING)
+        self.assertEqual(raised.exception.priced.undeliverable[0]['product'], product)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 5)
+
+
+# --- Catalog read model ---
+class CatalogCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(farmer=make_farmer(), name='Tomatoes', price=20, stock=10,
+                                              category='vegetables', is_approved=True)
+
+    def test_cached_until_the_version_is_bumped(self):
+        self.assertEqual([row['id'] for row in get_catalog()['vegetables']], [self.product.id])
+        with self.assertNumQueries(0):
+            get_catalog()
+
+        Product.objects.filter(pk=self.product.pk).update(stock=0)  # no signal, no bump
+        self.assertEqual(len(get_catalog()['vegetables']), 1)
+        invalidate_catalog()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_catalog()['vegetables'], [])
+
+    def test_only_sold_out_products_invalidate_it_at_checkout(self):
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(make_consumer(), {str(self.product.id): 4}, SHIPPING)
+        self.assertEqual(get_catalog_version(), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(make_consumer('second@example.com'), {str(self.product.id): 6}, SHIPPING)
+        self.assertNotEqual(get_catalog_version(), version)
+        self.assertEqual(get_catalog()['vegetables'], [])
+
+    def test_catalog_page_pincode(self):
+        self.assertEqual([row['id'] for row in catalog_page({'pincode': ' 380 007'})['results']], [self.product.id])
+        with self.assertRaises(InvalidCatalogQuery):
+            catalog_page({'pincode': '12'})
+
+    def test_cache_is_shared_between_processes(self):
+        # A per-process cache would let other workers serve a stale catalog forever
+        self.assertNotIn('locmem', settings.CACHES['default']['BACKEND'])
+
+
+# --- Stored carts ---
+class CartMergeTests(TestCase):
+
+    def test_session_cart_is_merged_on_login(self):
+        consumer = make_consumer()
+        farmer = make_farmer()
+        tomatoes, onions, milk = (Product.objects.create(farmer=farmer, name=name, price=10, stock=10, is_approved=True)
+                                  for name in ('Tomatoes', 'Onions', 'Milk'))
+        update_cart_lines(consumer, {str(tomatoes.id): 5, str(onions.id): 1})
+
+        session = self.client.session
+        session['cart'] = {str(tomatoes.id): 2, str(onions.id): 4, str(milk.id): 1, 'junk': 'x'}
+        session.save()
+        response = self.client.post('/consumer/login/', {'consumerUsername': consumer.user.username,
+                                                         'consumerPassword': 'pass1234'})
+        self.assertRedirects(response, '/home/', fetch_redirect_response=False)
+
+        # The larger quantity of each line wins; the session copy is gone
+        self.assertEqual(get_cart(consumer), {str(tomatoes.id): 5, str(onions.id): 4, str(milk.id): 1})
+        self.assertNotIn('cart', self.client.session)
+
+
+# --- Cart pricing ---
+class CartPricingTests(TestCase):
+
+    def test_totals_follow_the_current_product_price(self):
+        consumer = make_consumer()
+        product = Product.objects.create(farmer=make_farmer(), name='Tomatoes', price=20, stock=10, is_approved=True)
+        update_cart_lines(consumer, {str(product.id): 2})
+        self.client.force_login(consumer.user)
+        self.assertEqual(self.client.get('/cart/').context['total_subtotal'], Decimal('40.00'))
+
+        # The stored cart only holds quantities, so a price change shows up at once
+        product.price = 25
+        product.save()
+        response = self.client.get('/cart/')
+        self.assertEqual(response.context['total_subtotal'], Decimal('50.00'))
+        self.assertEqual(response.context['total_items_count'], 2)
+
+        order = place_order(consumer, get_cart(consumer), SHIPPING)
+        self.assertEqual(order.total_amount, Decimal('50.00'))
+        self.assertEqual(order.items.get().price, Decimal('25.00'))
+
+
+# --- Rendered product cards ---
+class ProductCardTests(TestCase):
+
+    def setUp(self):
+        caches['cards'].clear()
+        self.product = Product.objects.create(farmer=make_farmer(), name='Tomatoes', price=20, stock=10, is_approved=True)
+
+    def test_cards_are_reused_until_the_product_changes(self):
+        template_name = 'partials/farmer_product_row.html'
+        with mock.patch('store.cards.get_template', wraps=get_template) as loader:
+            first = render_cards(template_name, [self.product], csrf_token='token-1')
+            second = render_cards(template_name, [self.product], csrf_token='token-2')
+            self.assertEqual(loader.call_count, 1)
+            # The cached card is shared, the CSRF token is the visitor's own
+            self.assertEqual(first.replace('token-1', 'token-2'), second)
+
+            self.product.price = 25
+            self.product.save()  # new updated_at, new card
+            self.assertIn('25', render_cards(template_name, [self.product]))
+            self.assertEqual(loader.call_count, 2)
+
+
+# --- Product thumbnails ---
+class ProductImageTests(TestCase):
+
+    def setUp(self):
+        self.thumbnails = tempfile.mkdtemp(prefix='store-thumbs-')
+        self.addCleanup(shutil.rmtree, self.thumbnails, ignore_errors=True)
+        thumbnail_settings = override_settings(PRODUCT_THUMBNAIL_DIR=self.thumbnails)
+        thumbnail_settings.enable()
+        self.addCleanup(thumbnail_settings.disable)
+        # Forget the manifest read by earlier tests, now and afterwards
+        _manifest.update(data={}, mtime=None, checked_at=0)
+        self.addCleanup(_manifest.update, data={}, mtime=None, checked_at=0)
+
+    def render(self, image_path):
+        return Template('{% load product_images %}{% product_image path "Tomatoes" %}').render(Context({'path': image_path}))
+
+    def test_manifest_lookup_and_fallback_to_the_original(self):
+        write_manifest({'Products/vegetables/tomatoes.jpg': {'hash': 'abc', 'width': 640, 'height': 480, 'variants': {
+            'webp': [[160, 'thumbs/Products/vegetables/tomatoes.abc.160.webp'], [320, 'thumbs/Products/vegetables/tomatoes.abc.320.webp']],
+            'jpeg': [[160, 'thumbs/Products/vegetables/tomatoes.abc.160.jpg'], [320, 'thumbs/Products/vegetables/tomatoes.abc.320.jpg']],
+        }}})
+        html = self.render('Products/vegetables/tomatoes.jpg')
+        self.assertIn('<source type="image/webp" srcset="/static/thumbs/Products/vegetables/tomatoes.abc.160.webp 160w, '
+                      '/static/thumbs/Products/vegetables/tomatoes.abc.320.webp 320w"', html)
+        self.assertIn('<img src="/static/thumbs/Products/vegetables/tomatoes.abc.320.jpg"', html)
+
+        # No thumbnails: the original photo, or the logo when a product has no image
+        self.assertIn('<img src="/static/Products/fruits/apples.jpg"', self.render('Products/fruits/apples.jpg'))
+        self.assertIn(f'<img src="/static/{DEFAULT_IMAGE}"', self.render(None))
+
+    def test_transparent_images_are_flattened_onto_white(self):
+        try:
+            from PIL import Image
+        except ImportError:
+            self.skipTest('Pillow is not installed')
+        # Only the logo (the fallback image, transparent around the edges)
+        with mock.patch('store.management.commands.build_product_thumbnails.PRODUCT_IMAGE_MAP', {}):
+            call_command('build_product_thumbnails', stdout=io.StringIO(), stderr=io.StringIO())
+
+        _manifest.update(checked_at=0)  # the command itself read the old manifest just now
+        variants = load_manifest()[DEFAULT_IMAGE]['variants']
+        self.assertEqual(set(variants), {'webp', 'jpeg'})
+        for fmt in ('webp', 'jpeg'):
+            width, name = variants[fmt][0]
+            with Image.open(Path(self.thumbnails) / name.split('/', 1)[1]) as thumbnail:
+                self.assertGreater(min(thumbnail.convert('RGB').getpixel((0, 0))), 240)
+
+
+# --- Product search ---
+class SearchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()  # new catalog version, so the index is rebuilt from this test's rows
+        farmer = make_farmer()
+        self.wheat = Product.objects.create(farmer=farmer, name='Wheat', price=30, stock=10,
+                                            category='grains', is_approved=True)
+        self.tomatoes = Product.objects.create(farmer=farmer, name='Tomatoes', description='Fresh and red',
+                                               price=20, stock=10, category='vegetables', is_approved=True)
+        Product.objects.create(farmer=farmer, name='Tomato puree', price=20, stock=10, is_approved=False)
+
+    def search(self, query):
+        return [row['id'] for row in search_products(query)]
+
+    def test_prefixes_aliases_typos_and_categories(self):
+        self.assertEqual(self.search('tom'), [self.tomatoes.id])  # the unapproved puree is not listed
+        self.assertEqual(self.search('gehu'), [self.wheat.id])
+        self.assertEqual(self.search('tomatos'), [self.tomatoes.id])
+        self.assertEqual(self.search('pulses'), [self.wheat.id])
+        self.assertEqual(self.search('red'), [self.tomatoes.id])
+        self.assertEqual(self.search('  '), [])
+
+    def test_concurrent_requests_share_one_rebuild(self):
+        def slow_rebuild():
+            time.sleep(0.05)
+            search_index.version, search_index.built_at = get_catalog_version(), time.monotonic()
+
+        invalidate_catalog()
+        with mock.patch.object(search_index, 'rebuild', side_effect=slow_rebuild) as rebuild:
+            with ThreadPoolExecutor(4) as pool:
+                list(pool.map(lambda i: search_index.ensure_fresh(), range(4)))
+        self.assertEqual(rebuild.call_count, 1)
+
+    def test_index_follows_product_changes(self):
+        self.assertEqual(self.search('wheat'), [self.wheat.id])
+        self.wheat.stock = 0
+        self.wheat.save()
+        self.assertEqual(self.search('wheat'), [])
+
+
+# --- Product taxonomy ---
+class TaxonomyTests(TestCase):
+
+    def test_lookup(self):
+        wheat = lookup('wheat (GEHU)')
+        self.assertEqual((wheat.name, wheat.category, wheat.aliases), ('Wheat (gehu)', 'grains', ('wheat', 'gehu')))
+        self.assertEqual(lookup('Milk').default_unit, 'litre')
+        unknown = lookup('Dragon fruit')
+        self.assertEqual((unknown.category, unknown.image_path, unknown.default_unit), ('vegetables', DEFAULT_IMAGE, 'kg'))
+
+    def test_add_products_page_onboards_from_the_registry(self):
+        farmer = make_farmer()
+        self.client.force_login(farmer.user)
+        self.client.post('/farmer/products/add/', {'product': ['Milk', 'Wheat (gehu)', 'Milk']})
+        self.assertEqual(
+            sorted(Product.objects.filter(farmer=farmer).values_list('name', 'category', 'unit', 'price', 'stock')),
+            [('Milk', 'dairy', 'litre', Decimal('0.00'), 0), ('Wheat (gehu)', 'grains', 'kg', Decimal('0.00'), 0)],
+        )
+        # Products already in the inventory are skipped
+        self.client.post('/farmer/products/add/', {'product': ['Milk', 'Ghee']})
+        self.assertEqual(Product.objects.filter(farmer=farmer).count(), 3)
+
+
+# --- Bulk inventory updates ---
+class BulkInventoryTests(TestCase):
+
+    def setUp(self):
+        self.farmer = make_farmer()
+        self.product = Product.objects.create(farmer=self.farmer, name='Tomatoes', price=20, stock=10, is_approved=True)
+        self.client.force_login(self.farmer.user)
+
+    def post_json(self, **change):
+        return self.client.post('/farmer/products/bulk-update/', {'changes': [{'product_id': self.product.id, **change}]},
+                                content_type='application/json')
+
+    def test_json_batch(self):
+        response = self.post_json(price='25.5', unit='kg', stock=40)
+        self.assertEqual(response.json()['status'], 'success')
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.price, self.product.stock), (Decimal('25.50'), 40))
+
+        # Out of the column's range: rejected, not saved and left unreadable
+        for change in ({'price': '1e12', 'stock': 5}, {'price': '10', 'stock': 10**20}, {'price': '-1', 'stock': 5}):
+            response = self.post_json(unit='kg', **change)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['results'][0]['status'], 'error')
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.price, self.product.stock), (Decimal('25.50'), 40))
+
+    def test_csv_batch(self):
+        def upload(row):
+            content = f'product_id,price,unit,stock\n{self.product.id},{row}\n'.encode()
+            return self.client.post('/farmer/products/bulk-update/', {'file': SimpleUploadedFile('stock.csv', content)})
+
+        self.assertEqual(upload('30,kg,7').json()['status'], 'success')
+        self.assertEqual(upload('99999999.99,kg,7').json()['status'], 'success')
+        self.assertEqual(upload('100000000,kg,7').status_code, 400)
+        self.assertEqual(upload('30,kg,seven').status_code, 400)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.price, self.product.stock), (Decimal('99999999.99'), 7))
+
+
+# --- Farmer order browsing ---
+class FarmerOrdersTests(TestCase):
+
+    def setUp(self):
+        self.farmer = make_farmer()
+        product = Product.objects.create(farmer=self.farmer, name='Tomatoes', price=20, stock=10, is_approved=True)
+        self.order = place_order(make_consumer(), {str(product.id): 2}, SHIPPING)
+        self.client.force_login(self.farmer.user)
+
+    def test_impossible_dates_are_ignored(self):
+        response = self.client.get('/farmer/orders/', {'start': '2020-13-45', 'end': '2020-02-30'})
+        self.assertContains(response, 'Tomatoes')
+        response = self.client.get('/farmer/orders/export/csv/', {'start': '2020-13-45'})
+        self.assertIn(str(self.order.id), b''.join(response.streaming_content).decode())
+
+
+# --- Streaming exports ---
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.farmer = make_farmer()
+        other = make_farmer('other@example.com', kisan_id='KISAN2')
+        tomatoes = Product.objects.create(farmer=self.farmer, name='Tomatoes', price=20, stock=10, is_approved=True)
+        onions = Product.objects.create(farmer=self.farmer, name='Onions', price=10, stock=10, is_approved=True)
+        milk = Product.objects.create(farmer=other, name='Milk', price=50, stock=10, is_approved=True)
+        consumer = make_consumer()
+        self.delivered = place_order(consumer, {str(tomatoes.id): 2, str(milk.id): 1}, SHIPPING)
+        fulfil_orders(self.farmer, [self.delivered.id])
+        self.pending = place_order(consumer, {str(onions.id): 3}, SHIPPING)
+        self.client.force_login(self.farmer.user)
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_orders_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('/farmer/orders/export/csv/'))))
+        # Only this farmer's items, oldest first
+        self.assertEqual([(row['order_id'], row['product'], row['total'], row['delivered']) for row in rows], [
+            (str(self.delivered.id), 'Tomatoes', '40.00', 'True'),
+            (str(self.pending.id), 'Onions', '30.00', 'False'),
+        ])
+
+    def test_payouts_jsonl(self):
+        lines = [json.loads(line) for line in self.export('/farmer/payments/export/jsonl/').splitlines()]
+        # Delivered items only, split into commission and the farmer's share
+        self.assertEqual(lines, [{
+            'order_id': self.delivered.id, 'order_date': lines[0]['order_date'], 'product': 'Tomatoes', 'quantity': 2,
+            'total': '40.00', 'commission': '6.00', 'farmer_amount': '34.00', 'paid_out': False,
+        }])
+        self.assertEqual(self.client.get('/farmer/orders/export/xml/').status_code, 404)
+
+
+# --- Per-farmer fulfilment ---
+class FulfilmentTests(TestCase):
+
+    def test_multi_farmer_order_is_delivered_only_when_every_farmer_fulfilled(self):
+        first = make_farmer()
+        second = make_farmer('second@example.com', kisan_id='KISAN2')
+        tomatoes = Product.objects.create(farmer=first, name='Tomatoes', price=20, stock=10,
+                                          category='vegetables', is_approved=True)
+        milk = Product.objects.create(farmer=second, name='Milk', price=50, stock=10,
+                                      category='dairy', is_approved=True)
+        order = place_order(make_consumer(), {str(tomatoes.id): 1, str(milk.id): 2}, SHIPPING)
+
+        self.assertEqual(fulfil_orders(first, [order.id]), ([order.id], []))
+        order.refresh_from_db()
+        self.assertFalse(order.is_delivered)
+        self.assertEqual(fulfil_orders(first, [order.id]), ([], []))  # nothing left for this farmer
+
+        self.assertEqual(fulfil_orders(second, [order.id]), ([order.id], [order.id]))
+        order.refresh_from_db()
+        self.assertTrue(order.is_delivered)
+
+
+# --- Farmer dashboard metrics ---
+class DashboardMetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.farmer = make_farmer()
+        self.product = Product.objects.create(farmer=self.farmer, name='Tomatoes', price=20, stock=10,
+                                              is_approved=True)
+
+    def test_cached_metrics_are_dropped_after_an_order_and_a_fulfilment(self):
+        self.assertEqual(get_farmer_metrics(self.farmer.id)['pending_orders_count'], 0)
+        with self.assertNumQueries(0):
+            get_farmer_metrics(self.farmer.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = place_order(make_consumer(), {str(self.product.id): 3}, SHIPPING)
+        self.assertEqual(get_farmer_metrics(self.farmer.id)['pending_orders_count'], 1)
+
+        self.client.force_login(self.farmer.user)
+        response = self.client.post('/farmer/orders/fulfil/', json.dumps({'order_ids': [order.id]}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['fulfilled_orders'], [order.id])
+        metrics = get_farmer_metrics(self.farmer.id)
+        self.assertEqual(metrics['pending_orders_count'], 0)
+        self.assertEqual(metrics['total_earnings'], Decimal('60.00'))
+
+
+# --- Admin bulk operations ---
+class AdminBulkTests(TestCase):
+
+    def test_payout_batch_settles_approved_farmers(self):
+        paid, broken, idle = make_farmer(), make_farmer('b@example.com', 'KISAN2'), make_farmer('c@example.com', 'KISAN3')
+        consumer = make_consumer()
+        for farmer in (paid, broken):
+            product = Product.objects.create(farmer=farmer, name='Tomatoes', price=100, stock=10, is_approved=True)
+            order = place_order(consumer, {str(product.id): 2}, SHIPPING)
+            fulfil_orders(farmer, [order.id])
+            record_delivery(order)  # normally run by the order_delivered event handler
+        FarmerLedger.objects.filter(farmer=broken).update(unpaid_items=5)  # totals out of step with the entries
+        Farmer.objects.update(payout_status='approved')
+
+        rows = settle_farmers(Farmer.objects.all(), chunk_size=2)
+        self.assertEqual([(row['farmer_id'], row['status']) for row in rows],
+                         [(paid.id, 'paid'), (broken.id, 'mismatch'), (idle.id, 'nothing to pay')])
+        self.assertEqual(rows[0]['net'], Decimal('170.00'))
+
+        ledger = FarmerLedger.objects.get(farmer=paid)
+        self.assertEqual((ledger.unpaid_items, ledger.unpaid_net, ledger.total_paid_out), (0, 0, Decimal('170.00')))
+        self.assertFalse(OrderItem.objects.filter(product__farmer=paid, is_paid_out=False).exists())
+        self.assertTrue(OrderItem.objects.filter(product__farmer=broken, is_paid_out=False).exists())
+        self.assertEqual(dict(Farmer.objects.values_list('id', 'payout_status')),
+                         {paid.id: 'none', broken.id: 'approved', idle.id: 'none'})
+
+        report = io.StringIO()
+        write_payout_report(rows, report)
+        total = list(csv.DictReader(io.StringIO(report.getvalue())))[-1]
+        self.assertEqual((total['farmer'], total['net']), ('TOTAL', '170.00'))
+
+    def test_approve_products_in_chunks(self):
+        farmer = make_farmer()
+        Product.objects.bulk_create([Product(farmer=farmer, name=f'Product {i}', price=10, stock=5) for i in range(5)])
+        modeladmin = mock.Mock()
+        with mock.patch('store.admin.APPROVAL_CHUNK_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            approve_products(modeladmin, None, Product.objects.all())
+        self.assertEqual(Product.objects.filter(is_approved=True).count(), 5)
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries.captured_queries), 3)
+        modeladmin.message_user.assert_called_once_with(None, '5 products approved.')
+
+
+# --- Delivery runs ---
+class DeliveryRunTests(TestCase):
+
+    def test_plan_route_visits_nearest_first(self):
+        start = (0.0, 0.0)
+        points = [(0.0, 3.0), (0.0, 1.0), (0.0, 2.0)]
+        self.assertEqual(plan_route(start, points), [1, 2, 0])
+
+    def test_run_groups_by_pincode_and_completes_in_bulk(self):
+        farmer = make_farmer()  # pincode 380007
+        ServiceArea.objects.create(farmer=farmer, pincode_prefix='380')
+        ServiceArea.objects.create(farmer=farmer, pincode_prefix='999999')  # no known location
+        ServiceArea.objects.create(pincode_prefix='999999')
+        product = Product.objects.create(farmer=farmer, name='Tomatoes', price=20, stock=50,
+                                         category='vegetables', is_approved=True)
+        consumer = make_consumer()
+        orders = [
+            place_order(consumer, {str(product.id): 1}, {**SHIPPING, 'pincode': pincode})
+            for pincode in ['380015', '380007', '380015', '999999']
+        ]
+
+        run = plan_delivery_run(farmer)
+        self.assertEqual([stop.pincode for stop in run.stops], ['380007', '380015', '999999'])
+        self.assertEqual(run.stops[0].distance_km, 0)
+        self.assertEqual(len(run.stops[1].orders), 2)
+        self.assertIsNone(run.stops[2].distance_km)
+
+        fulfilled, delivered = fulfil_orders(farmer, [order.id for order in orders[:3]])
+        self.assertEqual(len(fulfilled), 3)
+        self.assertEqual(Order.objects.filter(is_delivered=True).count(), 3)
+        self.assertEqual(OrderEvent.objects.filter(event_type='order_delivered').count(), 3)
+        self.assertEqual(plan_delivery_run(farmer).order_count, 1)
+
+
+# --- Seeded marketplace and benchmarks ---
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.created = seed_marketplace(farmers=3, products_per_farmer=4, consumers=4, orders=30, seed=7)
+
+    def test_seeded_ledgers_match_delivered_items(self):
+        self.assertEqual(self.created['farmers'], 3)
+        self.assertEqual(self.created['orders'], Order.objects.count())
+        delivered = OrderItem.objects.filter(is_fulfilled=True)
+        self.assertEqual(self.created['ledger_entries'], delivered.count())
+        self.assertEqual(sum(ledger.unpaid_items for ledger in FarmerLedger.objects.all()), delivered.count())
+        with self.assertRaises(ValueError):
+            seed_marketplace(farmers=1)
+
+    def test_report_and_regressions(self):
+        report = run_benchmarks(['consumer_home', 'checkout_view'], iterations=3, warmup=1, profile_iterations=1)
+        for result in report['scenarios'].values():
+            self.assertEqual(result['errors'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual(compare_reports(report, report), [])
+
+        slower = json.loads(json.dumps(report))
+        slower['scenarios']['checkout_view']['p95_ms'] *= 2
+        slower['scenarios']['checkout_view']['queries'] += 1
+        self.assertEqual(
+            [(name, metric) for name, metric, before, after in compare_reports(report, slower)],
+            [('checkout_view', 'p95_ms'), ('checkout_view', 'queries')],
+        )
+
+
+# --- Async views (through the ASGI handler) ---
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        self.farmer = make_farmer()
+        self.consumer = make_consumer()
+        self.product = Product.objects.create(farmer=self.farmer, name='Tomatoes', price=20, stock=30,
+                                              category='vegetables', is_approved=True)
+        self.order = place_order(self.consumer, {str(self.product.id): 2}, SHIPPING)
+        self.async_client.force_login(self.consumer.user)
+
+    async def test_cart_catalog_and_confirmation(self):
+        response = await self.async_client.post('/cart/update/', {'lines': {str(self.product.id): 3}},
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['lines'], {str(self.product.id): 3})
+        self.assertEqual(response.json()['subtotal'], '60.00')
+
+        response = await self.async_client.get('/api/catalog/', {'pincode': '380007'})
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.product.id])
+        for pincode in ('3800', '38000x', '3800077'):
+            response = await self.async_client.get('/api/catalog/', {'pincode': pincode})
+            self.assertEqual(response.status_code, 400)
+
+        response = await self.async_client.get(f'/order/confirmation/{self.order.id}/')
+        self.assertContains(response, 'Tomatoes')
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1)
+    async def test_sampled_async_requests_record_their_queries(self):
+        metrics_registry.reset()
+        await self.async_client.get('/api/catalog/')
+        self.assertRegex(metrics_registry.render(), r'store_db_queries_sum\{view="catalog_api"\} [1-9]')
+
+    async def test_out_of_range_quantities_are_rejected(self):
+        for quantity in (10**20, -1, 'many'):
+            response = await self.async_client.post('/cart/update/', {'lines': {str(self.product.id): quantity}},
+                                                    content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(await sync_to_async(get_cart)(self.consumer), {})
+
+    async def test_farmers_are_turned_away(self):
+        await self.async_client.aforce_login(self.farmer.user)
+        response = await self.async_client.post('/cart/update/', {'lines': {}}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+
+# --- Database profiles ---
+class DatabaseProfileTests(TestCase):
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_only_replica_reads_outside_transactions_leave_the_primary(self):
+        router = ReadReplicaRouter()
+        self.assertEqual(router.db_for_read(Product), 'default')
+        # TestCase runs every test in a transaction
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Product), 'default')
+        with mock.patch.object(connection, 'in_atomic_block', False), replica_reads():
+            self.assertEqual(router.db_for_read(Product), 'replica1')
+            self.assertEqual(router.db_for_write(Product), 'default')
+
+    def test_sqlite_pragmas_are_applied(self):
+        if connection.vendor != 'sqlite' or not settings.SQLITE_PRAGMAS:
+            self.skipTest('Not the tuned SQLite profile')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+
+
+# --- Request metrics ---
+class RequestMetricsTests(TestCase):
+
+    def setUp(self):
+        metrics_registry.reset()
+        self.farmer = make_farmer()
+        self.products = [
+            Product.objects.create(farmer=self.farmer, name=f'Product {i}', price=10, stock=5, is_approved=True)
+            for i in range(N_PLUS_ONE_MIN)
+        ]
+
+    def test_n_plus_one_and_duplicate_queries_are_flagged(self):
+        with record_queries() as recorder:
+            for product in self.products:
+                Product.objects.get(id=product.id)
+            Product.objects.get(id=self.products[0].id)
+        self.assertEqual(recorder.count, N_PLUS_ONE_MIN + 1)
+        self.assertEqual(recorder.duplicates(), 1)
+        self.assertEqual([count for shape, count in recorder.n_plus_one()], [N_PLUS_ONE_MIN + 1])
+
+    def test_metrics_endpoint(self):
+        self.client.login(username=self.farmer.user.username, password='pass1234')
+        with override_settings(REQUEST_METRICS_SAMPLE_RATE=1), self.assertLogs('store.metrics', 'INFO') as logs:
+            self.client.get('/farmer/dashboard/')
+        self.assertEqual(json.loads(logs.records[0].getMessage())['view'], 'farmer_dashboard')
+
+        self.assertEqual(self.client.get('/metrics/').status_code, 404)
+        User.objects.filter(id=self.farmer.user_id).update(is_staff=True)
+        body = self.client.get('/metrics/').content.decode()
+        self.assertIn('store_request_duration_ms_count{view="farmer_dashboard"} 1', body)
+        self.assertIn('store_db_queries_count{view="farmer_dashboard"} 1', body)
+
+
+# --- Query plans of the hot views ---
+# Every query a hot view runs is put through EXPLAIN QUERY PLAN; a plain
+# "SCAN <table>" (no index) on one of our tables fails the test.
+TABLE_SCAN_RE = re.compile(r'\bSCAN (store_\w+)\b(?! USING)')
+
+
+class QueryPlanTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.farmer = make_farmer()
+        self.consumer = make_consumer()
+        self.products = [
+            Product.objects.create(farmer=self.farmer, name=name, price=20, stock=30,
+                                   category=category, is_approved=True)
+            for name, category in [('Tomatoes', 'vegetables'), ('Apples', 'fruits'), ('Milk', 'dairy')]
+        ]
+        self.order = place_order(self.consumer, {str(self.products[0].id): 2, str(self.products[1].id): 1}, SHIPPING)
+        delivered = place_order(self.consumer, {str(self.products[2].id): 3}, SHIPPING)
+        fulfil_orders(self.farmer, [delivered.id])
+        record_delivery(delivered)
+
+    def assertNoTableScans(self, method, url, data=None, username=None, **extra):
+        self.client.login(username=username, password='pass1234')
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data or {}, **extra)
+        self.assertLess(response.status_code, 400, url)
+
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+                self.assertIsNone(TABLE_SCAN_RE.search(plan), f'{url} does a table scan:\n{sql}\n{plan}')
+
+    def test_consumer_views(self):
+        consumer = self.consumer.user.username
+        self.assertNoTableScans('get', '/home/', username=consumer)
+        self.assertNoTableScans('get', '/home/', {'q': 'tomato'}, username=consumer)
+        self.assertNoTableScans('get', '/api/catalog/', {'category': 'fruits', 'min_price': '5'}, username=consumer)
+        self.assertNoTableScans('get', '/api/catalog/', {'pincode': '380007'}, username=consumer)
+
+        update_cart_lines(self.consumer, {self.products[0].id: 1})
+        self.assertNoTableScans('get', '/cart/', username=consumer)
+        self.assertNoTableScans('post', '/cart/checkout/', {
+            'user-full-name': 'Test', 'user-mobile': '1', 'user-address': 'x',
+            'user-pincode': '380007', 'payment-method-new': 'Cash On Delivery',
+        }, username=consumer)
+        self.assertNoTableScans('get', f'/order/confirmation/{self.order.id}/', username=consumer)
+
+    def test_farmer_views(self):
+        farmer = self.farmer.user.username
+        self.assertNoTableScans('get', '/farmer/dashboard/', username=farmer)
+        self.assertNoTableScans('get', '/farmer/products/', username=farmer)
+        self.assertNoTableScans('get', '/farmer/orders/', username=farmer)
+        self.assertNoTableScans('get', '/farmer/orders/', {'status': 'pending', 'start': '2020-01-01'}, username=farmer)
+        self.assertNoTableScans('get', '/farmer/payments/', username=farmer)
+        self.assertNoTableScans('get', '/farmer/delivery-run/', username=farmer)
+        self.assertNoTableScans('post', f'/farmer/order/complete/{self.order.id}/', username=farmer)
+        self.assertNoTableScans('post', '/farmer/delivery-run/', {'order_ids': [self.order.id]}, username=farmer)
+        self.assertNoTableScans('post', '/farmer/orders/fulfil/', username=farmer,
+                                data=json.dumps({'order_ids': [self.order.id]}), content_type='application/json')
+
+        self.farmer.payout_status = 'approved'
+        self.farmer.save()
+        self.assertNoTableScans('get', '/farmer/collect-payment/', username=farmer)
+        self.assertNoTableScans('post', '/farmer/collect-payment/', {
+            'bank_name': 'Bank', 'account_holder': 'Test', 'account_number': '1', 'ifsc_code': 'IFSC',
+        }, username=farmer)
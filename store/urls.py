@@ -9,6 +9,7 @@ urlpatterns = [
     path('consumer/signup/', views.consumer_signup_view, name='consumer_signup'),
     path('consumer/login/', views.consumer_login_view, name='consumer_login'),
     path('home/', views.consumer_home_view, name='consumer_home'),
+    path('api/catalog/', views.catalog_api_view, name='catalog_api'),
     path('about/', views.about_us_view, name='about_us'),
     path('reviews/', views.reviews_view, name='reviews'),
 
@@ -19,9 +20,14 @@ urlpatterns = [
     path('farmer/products/', views.farmer_products_view, name='farmer_products'),
     path('farmer/products/add/', views.farmer_add_product_view, name='farmer_add_product'),
     path('farmer/product/update/<int:product_id>/', views.update_product_view, name='update_product'),
+    path('farmer/products/bulk-update/', views.bulk_update_products_view, name='bulk_update_products'),
     path('farmer/product/delete/<int:product_id>/', views.delete_product_view, name='delete_product'),
     path('farmer/orders/', views.farmer_orders_view, name='farmer_orders'),
+    path('farmer/orders/export/<str:fmt>/', views.farmer_orders_export_view, name='farmer_orders_export'),
+    path('farmer/orders/fulfil/', views.fulfil_orders_view, name='fulfil_orders'),
+    path('farmer/delivery-run/', views.farmer_delivery_run_view, name='farmer_delivery_run'),
     path('farmer/payments/', views.farmer_payments_view, name='farmer_payments'),
+    path('farmer/payments/export/<str:fmt>/', views.farmer_payments_export_view, name='farmer_payments_export'),
     path('farmer/order/complete/<int:order_id>/', views.complete_order_view, name='complete_order'),
     path('farmer/request-payout/', views.request_payout_view, name='request_payout'),
     path('farmer/collect-payment/', views.collect_payment_view, name='collect_payment'),
@@ -33,6 +39,7 @@ urlpatterns = [
 
     # --- General ---
     path('logout/', views.logout_view, name='logout'),
+    path('metrics/', views.metrics_view, name='metrics'),
     
     # --- REMOVED 'set_location' URL ---
 ]
\ No newline at end of file
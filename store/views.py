@@ -4,18 +4,36 @@ from django.contrib.auth.models import User
 from django.contrib.auth import login, authenticate, logout
 from django.contrib import messages
 from .models import Farmer, Consumer, Product, Order, OrderItem
+from .cart import MAX_CART_CHANGES, CartProblem, InvalidCartChange, aprice_cart, apply_cart_changes, clear_cart, drop_missing_lines, get_cart, get_cart_version, price_cart
+from .checkout import place_order
+from .dashboard import get_farmer_metrics, invalidate_farmer_metrics
+from .exports import EXPORT_FORMATS, ORDER_COLUMNS, PAYOUT_COLUMNS, order_rows, payout_rows, streaming_export
+from .orders import farmer_order_items, farmer_orders_page
+from .inventory import InventoryBatchError, apply_inventory_changes, onboard_products, parse_csv_changes
+from .ledger import get_ledger, settle_ledger, unsettled_entries
+from .delivery import plan_delivery_run
+from .fulfilment import MAX_FULFIL_ORDERS, fulfil_orders
+from .catalog import InvalidCatalogQuery, acatalog_page, get_catalog
+from .search import search_products
+from .metrics import metrics_registry
+from .service import normalize_pincode, service_index
+from .taxonomy import PRODUCT_TYPES, PRODUCT_TYPES_BY_CATEGORY
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 import json 
-from django.db import transaction
 from datetime import datetime, timedelta
 from decimal import Decimal
 from django.conf import settings 
-# --- Import Q for searching ---
-from django.db.models import Q 
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
 
 # --- Main/Shared Views ---
 
+async def _aconsumer(request):
+    # Async views can't touch request.user.consumer (a sync query): the Consumer or None
+    user = await request.auser()
+    return await Consumer.objects.filter(user_id=user.pk).afirst()
+
 def index_view(request):
     return render(request, 'index.html')
 
@@ -30,6 +48,14 @@ def about_us_view(request):
 def reviews_view(request):
     return render(request, 'reviews.html')
 
+def metrics_view(request):
+    # Request metrics of this process (see store/metrics.py), for staff users
+    # or a scraper sending "Authorization: Bearer <settings.METRICS_TOKEN>"
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not (request.user.is_staff or (token and request.headers.get('Authorization') == f'Bearer {token}')):
+        raise Http404
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # --- Consumer Views ---
 
 def consumer_signup_view(request):
@@ -86,8 +112,22 @@ def consumer_login_view(request):
     return render(request, 'consumer_login.html')
 
 
+def _delivery_pincode(request):
+    # ?pincode= (remembered in the session), else the pincode of the last order
+    pincode = normalize_pincode(request.GET.get('pincode'))
+    if pincode:
+        request.session['delivery_pincode'] = pincode
+        return pincode
+    pincode = request.session.get('delivery_pincode')
+    if pincode is None:
+        pincode = Order.objects.filter(consumer=request.user.consumer).order_by('-order_date').values_list('pincode', flat=True).first()
+        pincode = normalize_pincode(pincode)
+        if pincode:
+            request.session['delivery_pincode'] = pincode
+    return pincode
+
+
 # --- MODIFIED consumer_home_view ---
-# (Removed the backend search filtering logic)
 @login_required(login_url='consumer_login')
 def consumer_home_view(request):
     if not hasattr(request.user, 'consumer'):
@@ -95,24 +135,59 @@ def consumer_home_view(request):
         logout(request)
         return redirect('consumer_login')
 
-    # Start with all available products
-    products = Product.objects.filter(stock__gt=0, price__gt=0) 
+    # --- Only products from farmers who deliver to the consumer's pincode ---
+    pincode = _delivery_pincode(request)
+    farmer_ids = service_index.farmers_serving(pincode) if pincode else None
+
+    # --- Search is done on the server now (see store/search.py) ---
+    query = request.GET.get('q', '').strip()
     
-    # --- Get the search query, but DO NOT filter the 'products' list ---
-    query = request.GET.get('q')
+    if query:
+        # Only ship the matching page of products, not the whole catalog
+        search_results = search_products(query, request.GET.get('page'), farmer_ids=farmer_ids)
+        catalog = {}
+    else:
+        # All listable products, grouped by category (cached, see store/catalog.py)
+        search_results = None
+        catalog = get_catalog()
+        if farmer_ids is not None:
+            catalog = {
+                category: [row for row in rows if row['farmer_id'] in farmer_ids]
+                for category, rows in catalog.items()
+            }
     
     context = {
-        'vegetables': products.filter(category='vegetables'),
-        'fruits': products.filter(category='fruits'),
-        'dairy': products.filter(category='dairy'),
-        'grains': products.filter(category='grains'),
+        'vegetables': catalog.get('vegetables', []),
+        'fruits': catalog.get('fruits', []),
+        'dairy': catalog.get('dairy', []),
+        'grains': catalog.get('grains', []),
         
-        # --- Pass the query to the template for highlighting ---
-        'search_query': query 
+        'search_query': query,
+        'search_results': search_results,
+        'delivery_pincode': pincode,
+        'pincode_serviceable': pincode is None or service_index.is_serviceable(pincode),
+        'cart_state': {
+            'lines': get_cart(request.user.consumer),
+            'version': get_cart_version(request.user.consumer),
+        },
     }
     return render(request, 'consumer_home.html', context)
 
 
+# --- Catalog JSON API (keyset paginated, see store/catalog.py; async like update_cart_view) ---
+@login_required(login_url='consumer_login')
+async def catalog_api_view(request):
+    if await _aconsumer(request) is None:
+        return JsonResponse({'status': 'error', 'message': 'Not a consumer account'}, status=403)
+
+    try:
+        page = await acatalog_page(request.GET)
+    except InvalidCatalogQuery as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return JsonResponse({'status': 'success', **page})
+
+
 # --- Farmer Views ---
 
 def farmer_signup_view(request):
@@ -193,22 +268,8 @@ def farmer_dashboard_view(request):
         logout(request)
         return redirect('farmer_login')
 
-    farmer = request.user.farmer
-    products = Product.objects.filter(farmer=farmer)
-    farmer_order_items = OrderItem.objects.filter(product__farmer=farmer)
-    
-    # Fixed for SQLite
-    pending_order_ids = farmer_order_items.filter(order__is_delivered=False).values_list('order__id', flat=True)
-    pending_orders = len(set(pending_order_ids))
-    
-    total_earnings = sum(item.price * item.quantity for item in farmer_order_items.filter(order__is_delivered=True))
-
-    context = {
-        'live_products_count': products.filter(stock__gt=0, price__gt=0).count(),
-        'low_stock_products': products.filter(stock__gt=0, stock__lte=5),
-        'pending_orders_count': pending_orders,
-        'total_earnings': total_earnings,
-    }
+    # Aggregated in the database and cached per farmer (see store/dashboard.py)
+    context = get_farmer_metrics(request.user.farmer.id)
     return render(request, 'farmer_dashboard.html', context)
 
 @login_required(login_url='farmer_login')
@@ -223,75 +284,6 @@ def farmer_products_view(request):
     return render(request, 'farmer_products.html', context)
 
 
-# This is the logic to auto-assign images
-PRODUCT_IMAGE_MAP = {
-    # Vegetables
-    "Tomatoes": "Products/vegetables/tomatoes.jpg",
-    "Onions": "Products/vegetables/onions.jpg",
-    "Potatoes": "Products/vegetables/potatoes.jpg",
-    "Cabbage": "Products/vegetables/cabbage.jpg",
-    "Spinach": "Products/vegetables/spinach.jpg",
-    "Carrots": "Products/vegetables/carrots.jpg",
-    "Capsicum": "Products/vegetables/capsicum.jpg",
-    "Cauliflower": "Products/vegetables/cauliflower.jpg",
-    "Broccoli": "Products/vegetables/broccoli.jpg",
-    "Cucumber": "Products/vegetables/cucumber.jpg",
-    "Brinjal": "Products/vegetables/brinjal.jpg",
-    "Garlic": "Products/vegetables/garlic.jpg",
-    "Ginger": "Products/vegetables/ginger.jpg",
-    "Green Chilli": "Products/vegetables/green_chilli.jpg",
-    "Lemon": "Products/vegetables/lemon.jpg",
-    # Fruits
-    "Bananas": "Products/fruits/bananas.jpg",
-    "Apples": "Products/fruits/apples.jpg",
-    "Grapes": "Products/fruits/grapes.jpg",
-    "Mangoes": "Products/fruits/mangoes.jpg",
-    "Oranges": "Products/fruits/oranges.jpg",
-    "Pineapple": "Products/fruits/pineapple.jpg",
-    "Pomegranate": "Products/fruits/pomegranate.jpg",
-    "Kiwi": "Products/fruits/kiwi.jpg",
-    "Papaya": "Products/fruits/papaya.jpg",
-    "Watermelon": "Products/fruits/watermelon.jpg",
-    "Coconut": "Products/fruits/coconut.jpg",
-    "Muskmelon": "Products/fruits/muskmelon.jpg",
-    "Strawberry": "Products/fruits/strawberry.jpg",
-    "Litchi": "Products/fruits/litchi.jpg",
-    "Cherries": "Products/fruits/cherries.jpg",
-    # Grains & Pulses
-    "Wheat (gehu)": "Products/grains/wheat.jpg",
-    "Basmati rice": "Products/grains/rice.jpg",
-    "Toor dal (arhar)": "Products/grains/arhar.jpg",
-    "Moong dal (yellow)": "Products/grains/moong (yellow).jpg",
-    "Urad dal (split)": "Products/grains/split.jpg",
-    "Chana dal": "Products/grains/chana dal.jpg",
-    "Kidney beans (rajma)": "Products/grains/kidneybeans.jpg",
-    "Chickpeas (chhole)": "Products/grains/chickpeas.jpg",
-    "Oats": "Products/grains/oats.jpg",
-    "Barley": "Products/grains/barley.jpg",
-    "Rye": "Products/grains/rye.jpg",
-    "Teff": "Products/grains/teff.jpg",
-    "Sorghum (jowar)": "Products/grains/sorghum.jpg",
-    "Millet (bajra)": "Products/grains/millet.jpg",
-    "Buckwheat": "Products/grains/buckwheat.jpg",
-    # Dairy
-    "Milk": "Products/dairy/milk.jpg",
-    "Paneer": "Products/dairy/paneer.jpg",
-    "Ghee": "Products/dairy/ghee.jpg",
-    "Curd": "Products/dairy/curd.jpg",
-    "Butter": "Products/dairy/butter.jpg",
-    "Cheese Slice": "Products/dairy/cheese slice.jpg",
-    "Fresh Cream": "Products/dairy/cream.jpg",
-    "Lassi": "Products/dairy/lassi.jpg",
-    "Chaas (Buttermilk)": "Products/dairy/buttermilk.jpg",
-    "Bread": "Products/dairy/bread.jpg",
-    "Cheese Spread": "Products/dairy/cheese spread.jpg",
-    "Diced Cheese": "Products/dairy/diced cheese.jpg",
-    "Condensed Milk": "Products/dairy/condensed milk.jpg",
-    "Ice Cream": "Products/dairy/ice cream.jpg",
-    "Flavored Milk (Pack of 5)": "Products/dairy/flavoured milk.jpg",
-}
-
-
 @login_required(login_url='farmer_login')
 def farmer_add_product_view(request):
     if not hasattr(request.user, 'farmer'):
@@ -303,50 +295,32 @@ def farmer_add_product_view(request):
 
     if request.method == 'POST':
         selected_products = request.POST.getlist('product')
+        if request.POST.get('add_all'):
+            # Onboard the farmer's whole catalog in one go
+            selected_products = list(PRODUCT_TYPES)
         
         if not selected_products:
             messages.error(request, 'Please select at least one product to add.')
             return redirect('farmer_add_product')
 
-        existing_products = Product.objects.filter(farmer=farmer).values_list('name', flat=True)
-        
-        new_products_added = 0
-        products_to_create = []
-
-        for product_name in selected_products:
-            if product_name not in existing_products:
-                category = 'vegetables' # default
-                if product_name in ['Bananas', 'Apples', 'Grapes', 'Mangoes', 'Oranges', 'Pineapple', 'Pomegranate', 'Kiwi', 'Papaya', 'Watermelon', 'Coconut', 'Muskmelon', 'Strawberry', 'Litchi', 'Cherries']:
-                    category = 'fruits'
-                elif product_name in ['Wheat (gehu)', 'Basmati rice', 'Toor dal (arhar)', 'Moong dal (yellow)', 'Urad dal (split)', 'Chana dal', 'Kidney beans (rajma)', 'Chickpeas (chhole)', 'Oats', 'Barley', 'Rye', 'Teff', 'Sorghum (jowar)', 'Millet (bajra)', 'Buckwheat']:
-                    category = 'grains'
-                elif product_name in ['Milk', 'Paneer', 'Ghee', 'Curd', 'Butter', 'Cheese Slice', 'Fresh Cream', 'Lassi', 'Chaas (Buttermilk)', 'Bread', 'Cheese Spread', 'Diced Cheese', 'Condensed Milk', 'Ice Cream', 'Flavored Milk (Pack of 5)']:
-                    category = 'dairy'
-
-                image_path = PRODUCT_IMAGE_MAP.get(product_name, 'Images/logo.png') # Default image
-
-                products_to_create.append(
-                    Product(
-                        farmer=farmer, 
-                        name=product_name, 
-                        category=category, 
-                        price=0, 
-                        stock=0, 
-                        unit='kg',
-                        image_path=image_path
-                    )
-                )
-                new_products_added += 1
+        # One query to diff against the inventory, one bulk insert (see store/inventory.py)
+        products_to_create = onboard_products(farmer, selected_products)
+        new_products_added = len(products_to_create)
         
         if products_to_create:
-            Product.objects.bulk_create(products_to_create)
             messages.success(request, f'Success! {new_products_added} new products added. Please set their price and stock.')
         else:
             messages.info(request, 'All selected products were already in your inventory.')
 
         return redirect('farmer_products')
 
-    return render(request, 'farmer_add_product.html')
+    context = {
+        'product_types_by_category': [
+            (label, PRODUCT_TYPES_BY_CATEGORY.get(key, ())) for key, label in Product.CATEGORY_CHOICES
+        ],
+        'existing_products': set(Product.objects.filter(farmer=farmer).values_list('name', flat=True)),
+    }
+    return render(request, 'farmer_add_product.html', context)
 
 
 @login_required(login_url='farmer_login')
@@ -373,6 +347,33 @@ def update_product_view(request, product_id):
     
     return redirect('farmer_products')
 
+# --- Bulk inventory editor (JSON batch or CSV upload, see store/inventory.py) ---
+@login_required(login_url='farmer_login')
+def bulk_update_products_view(request):
+    if not hasattr(request.user, 'farmer'):
+        return JsonResponse({'status': 'error', 'message': 'Not a farmer account'}, status=403)
+
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error'}, status=400)
+
+    try:
+        if 'file' in request.FILES:
+            rows = parse_csv_changes(request.FILES['file'])
+        else:
+            try:
+                rows = json.loads(request.body).get('changes')
+            except (ValueError, AttributeError):
+                raise InventoryBatchError('Invalid JSON body.')
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise InventoryBatchError('"changes" must be a list of objects.')
+        applied, results = apply_inventory_changes(request.user.farmer, rows)
+    except InventoryBatchError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    if not applied:
+        return JsonResponse({'status': 'error', 'message': 'Some rows are invalid, nothing was saved.', 'results': results}, status=400)
+    return JsonResponse({'status': 'success', 'updated': len(results), 'results': results})
+
 @login_required(login_url='farmer_login')
 def delete_product_view(request, product_id):
     if not hasattr(request.user, 'farmer'):
@@ -397,12 +398,92 @@ def farmer_orders_view(request):
         logout(request)
         return redirect('farmer_login')
     
-    order_items = OrderItem.objects.filter(product__farmer=request.user.farmer).order_by('-order__order_date')
+    # One keyset page at a time, with order + product joined in (see store/orders.py)
+    farmer = request.user.farmer
+    order_items, next_cursor = farmer_orders_page(farmer, request.GET)
+
+    # Keep the filters in the "older orders" link
+    filters = request.GET.copy()
+    filters.pop('cursor', None)
+
     context = {
-        'order_items': order_items
+        'order_items': order_items,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+        'filters': filters,
+        'filter_query': filters.urlencode(),
+        'farmer_products': Product.objects.filter(farmer=farmer).order_by('name').values('id', 'name'),
     }
     return render(request, 'farmer_orders.html', context)
 
+# --- Delivery runs: pending orders grouped by pincode (see store/delivery.py) ---
+@login_required(login_url='farmer_login')
+def farmer_delivery_run_view(request):
+    if not hasattr(request.user, 'farmer'):
+        messages.error(request, 'This page is for farmers only.')
+        logout(request)
+        return redirect('farmer_login')
+
+    farmer = request.user.farmer
+    if request.method == 'POST':
+        order_ids = [order_id for order_id in request.POST.getlist('order_ids') if order_id.isdigit()]
+        fulfilled, delivered = fulfil_orders(farmer, order_ids)
+        if fulfilled:
+            invalidate_farmer_metrics([farmer.id])
+            messages.success(request, f'{len(fulfilled)} order(s) marked as delivered.')
+        else:
+            messages.error(request, 'No pending orders were selected.')
+        return redirect('farmer_delivery_run')
+
+    return render(request, 'farmer_delivery_run.html', {'run': plan_delivery_run(farmer)})
+
+# --- Bulk fulfilment API (see store/fulfilment.py) ---
+@login_required(login_url='farmer_login')
+def fulfil_orders_view(request):
+    if not hasattr(request.user, 'farmer'):
+        return JsonResponse({'status': 'error', 'message': 'Not a farmer account'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error'}, status=405)
+
+    try:
+        order_ids = [int(order_id) for order_id in json.loads(request.body).get('order_ids', [])]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'order_ids must be a list of order ids.'}, status=400)
+    if not order_ids or len(order_ids) > MAX_FULFIL_ORDERS:
+        return JsonResponse({'status': 'error', 'message': f'Send 1 to {MAX_FULFIL_ORDERS} order ids.'}, status=400)
+
+    fulfilled, delivered = fulfil_orders(request.user.farmer, order_ids)
+    if fulfilled:
+        invalidate_farmer_metrics([request.user.farmer.id])
+    return JsonResponse({'status': 'success', 'fulfilled_orders': fulfilled, 'delivered_orders': delivered})
+
+# --- Streaming exports (see store/exports.py) ---
+@login_required(login_url='farmer_login')
+def farmer_orders_export_view(request, fmt):
+    if not hasattr(request.user, 'farmer'):
+        messages.error(request, 'This page is for farmers only.')
+        logout(request)
+        return redirect('farmer_login')
+
+    if fmt not in EXPORT_FORMATS:
+        raise Http404('Unknown export format.')
+
+    items = farmer_order_items(request.user.farmer, request.GET).order_by('order__order_date', 'id')
+    return streaming_export(ORDER_COLUMNS, order_rows(items), fmt, 'orders')
+
+@login_required(login_url='farmer_login')
+def farmer_payments_export_view(request, fmt):
+    if not hasattr(request.user, 'farmer'):
+        messages.error(request, 'This page is for farmers only.')
+        logout(request)
+        return redirect('farmer_login')
+
+    if fmt not in EXPORT_FORMATS:
+        raise Http404('Unknown export format.')
+
+    items = farmer_order_items(request.user.farmer, request.GET).order_by('order__order_date', 'id')
+    return streaming_export(PAYOUT_COLUMNS, payout_rows(items), fmt, 'payouts')
+
 # store/views.py
 from django.shortcuts import render, redirect
 # ... (all your other imports) ...
@@ -420,35 +501,19 @@ def farmer_payments_view(request):
 
     farmer = request.user.farmer # Get the farmer object
 
-    # Get all COMPLETED but NOT YET PAID OUT order items for this farmer
-    order_items = OrderItem.objects.filter(
-        product__farmer=farmer, 
-        order__is_delivered=True,
-        is_paid_out=False  # --- Only show unpaid items ---
-    ).order_by('order__order_date') # Show oldest first
-
-    payment_data = []
-    commission_rate = Decimal('0.15') # 15% commission
-    total_unpaid_amount = Decimal('0.00') # This is what the farmer is owed
-
-    for item in order_items:
-        total_amount = item.price * item.quantity
-        our_commission = total_amount * commission_rate
-        farmer_amount = total_amount - our_commission
-        total_unpaid_amount += farmer_amount # Sum up the farmer's total due
-
-        payment_data.append({
-            'item': item,
-            'total_amount': total_amount,
-            'our_commission': our_commission,
-            'farmer_amount': farmer_amount,
-        })
+    # Totals come from the farmer's ledger row (see store/ledger.py)
+    ledger = get_ledger(farmer)
+
+    # Unpaid earnings, amounts were already worked out on delivery
+    ledger_entries = unsettled_entries(ledger).select_related(
+        'order_item__order', 'order_item__product'
+    ).order_by('order_item__order__order_date') # Show oldest first
 
     context = {
-        'payment_data': payment_data,
-        'total_unpaid_amount': total_unpaid_amount, # Pass the total
+        'ledger_entries': ledger_entries,
+        'total_unpaid_amount': ledger.unpaid_net, # Pass the total
         'farmer_status': farmer.payout_status, # Pass the status
-        'has_unpaid_items': order_items.exists() # Pass if there's anything to pay
+        'has_unpaid_items': ledger.unpaid_items > 0 # Pass if there's anything to pay
     }
     return render(request, 'farmer_py.html', context)
 
@@ -456,25 +521,41 @@ def farmer_payments_view(request):
 
 # --- Cart & Checkout Views ---
 
+# Async: runs on the event loop under ASGI (connectfarma_project1/asgi.py), so a
+# slow client doesn't hold a worker thread. The DB work still runs in Django's
+# sync thread, one hop per query or transaction.
 @login_required(login_url='consumer_login')
-def update_cart_view(request):
-    if not hasattr(request.user, 'consumer'):
+async def update_cart_view(request):
+    consumer = await _aconsumer(request)
+    if consumer is None:
         return JsonResponse({'status': 'error', 'message': 'Not a consumer account'}, status=403)
 
-    if request.method == 'POST' and request.user.is_authenticated:
-        data = json.loads(request.body)
-        product_id = str(data.get('product_id'))
-        quantity = int(data.get('quantity'))
-        cart = request.session.get('cart', {})
-
-        if quantity > 0:
-            cart[product_id] = quantity
-        elif product_id in cart:
-            del cart[product_id]
-        
-        request.session['cart'] = cart
-        total_items = sum(cart.values())
-        return JsonResponse({'status': 'success', 'total_items': total_items})
+    if request.method == 'POST':
+        # Batched sync: the page coalesces clicks and sends {lines: {product_id: quantity}};
+        # the version in the reply lets it ignore out-of-order replies and adopt
+        # changes made in another tab. A single {product_id, quantity} still works.
+        try:
+            data = json.loads(request.body)
+            changes = data.get('lines') or {data.get('product_id'): data.get('quantity')}
+        except (ValueError, AttributeError):
+            return JsonResponse({'status': 'error', 'message': 'Invalid cart update'}, status=400)
+        if not isinstance(changes, dict) or len(changes) > MAX_CART_CHANGES:
+            return JsonResponse({'status': 'error', 'message': 'Invalid cart update'}, status=400)
+
+        # The whole batch is applied in one transaction (see store/cart.py) and the
+        # lines are read back in it too, so version and totals always match
+        try:
+            version, cart = await sync_to_async(apply_cart_changes)(consumer, changes)
+        except InvalidCartChange as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        priced = await aprice_cart(cart)
+        return JsonResponse({
+            'status': 'success',
+            'version': version,
+            'lines': cart,
+            'total_items': sum(cart.values()),
+            'subtotal': str(priced.subtotal),
+        })
     
     return JsonResponse({'status': 'error'}, status=400)
 
@@ -485,31 +566,16 @@ def cart_view(request):
         logout(request)
         return redirect('consumer_login')
 
-    cart = request.session.get('cart', {})
-    cart_items = []
-    total_subtotal = 0
-    total_items_count = 0
-
-    for product_id, quantity in cart.items():
-        try:
-            product = Product.objects.get(id=product_id)
-            item_total = product.price * quantity
-            cart_items.append({
-                'product': product,
-                'quantity': quantity,
-                'item_total': item_total,
-            })
-            total_subtotal += item_total
-            total_items_count += quantity
-        except Product.DoesNotExist:
-            if product_id in request.session['cart']:
-                del request.session['cart'][product_id]
-                request.session.modified = True
+    # Whole cart priced in one query (see store/cart.py)
+    priced = price_cart(get_cart(request.user.consumer), pincode=request.session.get('delivery_pincode'))
+    drop_missing_lines(request.user.consumer, priced)
+    for problem in priced.problem_messages():
+        messages.warning(request, problem)
 
     context = {
-        'cart_items': cart_items,
-        'total_subtotal': total_subtotal,
-        'total_items_count': total_items_count,
+        'cart_items': priced.lines,
+        'total_subtotal': priced.subtotal,
+        'total_items_count': priced.total_items,
     }
     return render(request, 'cart.html', context)
 
@@ -520,58 +586,39 @@ def checkout_view(request):
         logout(request)
         return redirect('consumer_login')
 
-    cart = request.session.get('cart', {})
+    cart = get_cart(request.user.consumer)
     if not cart:
         messages.error(request, 'Your cart is empty.')
         return redirect('cart_view')
         
     if request.method == 'POST':
+        pincode = normalize_pincode(request.POST.get('user-pincode'))
+        if not service_index.is_serviceable(pincode):
+            messages.error(request, f"Sorry, we don't deliver to pincode {request.POST.get('user-pincode')} yet.")
+            return redirect('checkout_view')
+        request.session['delivery_pincode'] = pincode
+
         try:
-            with transaction.atomic():
-                full_name = request.POST.get('user-full-name')
-                mobile = request.POST.get('user-mobile')
-                address = request.POST.get('user-address')
-                pincode = request.POST.get('user-pincode')
-                payment_method = request.POST.get('payment-method-new')
-
-                total_subtotal = 0
-                items_to_create = []
-                
-                for product_id, quantity in cart.items():
-                    product = Product.objects.get(id=product_id)
-                    if product.stock < quantity:
-                        raise Exception(f'Not enough stock for {product.name}')
-                    
-                    total_subtotal += product.price * quantity
-                    items_to_create.append({
-                        'product': product,
-                        'quantity': quantity,
-                        'price': product.price
-                    })
-
-                new_order = Order.objects.create(
-                    consumer=request.user.consumer,
-                    total_amount=total_subtotal,
-                    full_name=full_name,
-                    mobile=mobile,
-                    address=address,
-                    pincode=pincode,
-                    payment_method=payment_method
-                )
-
-                for item in items_to_create:
-                    OrderItem.objects.create(
-                        order=new_order,
-                        product=item['product'],
-                        quantity=item['quantity'],
-                        price=item['price']
-                    )
-                    item['product'].stock -= item['quantity']
-                    item['product'].save()
+            shipping = {
+                'full_name': request.POST.get('user-full-name'),
+                'mobile': request.POST.get('user-mobile'),
+                'address': request.POST.get('user-address'),
+                'pincode': pincode,
+                'payment_method': request.POST.get('payment-method-new'),
+            }
+            # Atomic stock decrements + bulk insert (see store/checkout.py)
+            new_order = place_order(request.user.consumer, cart, shipping)
             
-            del request.session['cart']
+            clear_cart(request.user.consumer)
             return redirect('order_confirmation', order_id=new_order.id)
 
+        except CartProblem as problem:
+            # Report every bad line at once and send the consumer back to fix the cart
+            drop_missing_lines(request.user.consumer, problem.priced)
+            for text in problem.priced.problem_messages():
+                messages.error(request, text)
+            return redirect('cart_view')
+
         except Exception as e:
             messages.error(request, f'An error occurred: {e}')
             return redirect('checkout_view')
@@ -586,7 +633,10 @@ def order_confirmation_view(request, order_id):
         return redirect('consumer_login')
 
     try:
-        order = Order.objects.get(id=order_id, consumer=request.user.consumer)
+        # One query for the order, one for its items with their products
+        order = Order.objects.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        ).get(id=order_id, consumer=request.user.consumer)
         delivery_fee = Decimal('30.00')
         grand_total = order.total_amount + delivery_fee
         
@@ -614,24 +664,14 @@ def complete_order_view(request, order_id):
         return redirect('farmer_login')
     
     if request.method == 'POST':
-        try:
-            # Find the order
-            order_to_complete = Order.objects.get(id=order_id)
-            
-            # **Security Check:** Ensure the logged-in farmer has at least one item in this order
-            # This prevents a farmer from marking another farmer's order as complete
-            if not OrderItem.objects.filter(order=order_to_complete, product__farmer=request.user.farmer).exists():
-                messages.error(request, 'You do not have permission to modify this order.')
-                return redirect('farmer_orders')
-
-            # Update the status
-            order_to_complete.is_delivered = True
-            order_to_complete.save()
-            
-            messages.success(request, f'Order {order_to_complete.id} has been marked as completed.')
-        
-        except Order.DoesNotExist:
-            messages.error(request, 'Order not found.')
+        # Only this farmer's items are marked; the order is delivered once every
+        # farmer in it has fulfilled their items (see store/fulfilment.py)
+        fulfilled, delivered = fulfil_orders(request.user.farmer, [order_id])
+        if fulfilled:
+            invalidate_farmer_metrics([request.user.farmer.id])
+            messages.success(request, f'Your items in Order {order_id} have been marked as completed.')
+        else:
+            messages.error(request, 'Order not found or nothing left for you to complete.')
         
         # Redirect back to the orders page
         return redirect('farmer_orders')
@@ -643,7 +683,7 @@ def request_payout_view(request):
     if request.method == 'POST':
         farmer = request.user.farmer
         # Only allow request if status is 'none' and they have items
-        if farmer.payout_status == 'none' and OrderItem.objects.filter(product__farmer=farmer, order__is_delivered=True, is_paid_out=False).exists():
+        if farmer.payout_status == 'none' and get_ledger(farmer).unpaid_items > 0:
             farmer.payout_status = 'requested'
             farmer.save()
             messages.success(request, 'Payout request submitted to admin.')
@@ -661,22 +701,11 @@ def collect_payment_view(request):
         messages.error(request, 'Your payout has not been approved by admin.')
         return redirect('farmer_payments')
 
-    # Get all items that will be paid out
-    items_to_be_paid = OrderItem.objects.filter(
-        product__farmer=farmer, 
-        order__is_delivered=True,
-        is_paid_out=False
-    )
-
-    # Calculate total
-    total_payout = Decimal('0.00')
-    commission_rate = Decimal('0.15')
-    for item in items_to_be_paid:
-        total_amount = item.price * item.quantity
-        farmer_amount = total_amount - (total_amount * commission_rate)
-        total_payout += farmer_amount
-
-    if not items_to_be_paid.exists() or total_payout == 0:
+    # The unpaid balance is kept on the ledger, no need to rescan the items
+    ledger = get_ledger(farmer)
+    total_payout = ledger.unpaid_net
+
+    if not ledger.unpaid_items or total_payout == 0:
         messages.error(request, 'No pending payments found.')
         farmer.payout_status = 'none' # Reset status
         farmer.save()
@@ -699,16 +728,14 @@ def collect_payment_view(request):
         # For this project, we just simulate success.
 
         try:
-            with transaction.atomic():
-                # 1. Mark all items as paid
-                items_to_be_paid.update(is_paid_out=True)
-
-                # 2. Reset farmer's payout status
-                farmer.payout_status = 'none'
-                farmer.save()
-
-            # 3. Show success
-            messages.success(request, f'Payment of ₹{total_payout:.2f} was successful! The amount will be credited to your account shortly.')
+            # 1. Settle the ledger: marks the items as paid and resets the payout status
+            payout = settle_ledger(farmer)
+            if payout is None:
+                messages.error(request, 'No pending payments found.')
+                return redirect('farmer_payments')
+
+            # 2. Show success
+            messages.success(request, f'Payment of ₹{payout.net:.2f} was successful! The amount will be credited to your account shortly.')
             return redirect('farmer_payments') # Redirect to payment page
 
         except Exception as e: